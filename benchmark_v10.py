@@ -0,0 +1,263 @@
+import pandas as pd
+import numpy as np
+import sys
+import pathlib
+import argparse
+import json
+import time
+import timeit
+import tempfile
+import tracemalloc
+import subprocess
+import platform
+import contextlib
+import io
+import retirement_model_v10 as model
+
+# --- Benchmark Settings ---
+BENCHMARK_DIR = pathlib.Path("benchmarks")
+START_YEAR = 2025
+TOTAL_PORTFOLIO = 1_500_000
+TOTAL_SPENDING = 85_000
+TOTAL_OTHER_INCOME = 20_000
+PERSON_NAMES = ['Alex', 'Sam']
+
+# Every case starts from BASE_HOUSEHOLD and scales one dimension along its ladder.
+BASE_HOUSEHOLD = {'accounts': 7, 'expenses': 5, 'income_streams': 2, 'projection_years': 35}
+SCALING_LADDERS = {
+    'accounts': [5, 50, 500, 5000],
+    'expenses': [5, 50, 500, 5000],
+    'income_streams': [2, 20, 200, 2000],
+    'projection_years': [30, 60, 100],
+}
+QUICK_LADDER_LENGTH = 2
+
+BENCHMARK_SCENARIO = {
+    'name': 'Benchmark (SS @ 67, Fill 22% Bracket)', 'Alex_ss_age': 67, 'Sam_ss_age': 67,
+    'roth_strategy': 'fill_bracket', 'roth_target_bracket_rate': 0.22, 'roth_end_year': START_YEAR + 9,
+}
+
+# --compare checks the metrics ending in '_s' (median seconds per call) and '_mb' (peak traced memory), where lower is better.
+# A timing only counts as a regression if it is slower by more than the threshold AND every current repeat is slower than every
+# baseline repeat, so run-to-run noise in the microsecond timings does not fail an unchanged commit.
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+DEFAULT_REPEAT = 7
+MIN_COMPARE_REPEAT = 5   # with fewer repeats, two runs of the same code often fail to overlap and --compare flags noise
+
+# --- Synthetic Household Generator ---
+def split_total(rng, total, count):
+    # Random but reproducible shares of a fixed total, so larger households hold the same money in more pieces.
+    return (rng.dirichlet(np.ones(count)) * total).round(2)
+
+def generate_household(output_dir, accounts=7, expenses=5, income_streams=2, projection_years=35, seed=0):
+    """Write an input_files_v10-style household with the requested number of rows to output_dir."""
+    rng = np.random.default_rng(seed)
+    output_dir = pathlib.Path(output_dir); output_dir.mkdir(parents=True, exist_ok=True)
+    end_year = START_YEAR + projection_years
+
+    pd.DataFrame({'parameter': ['start_year', 'projection_years', 'federal_filing_status', 'inflation_rate_general', 'inflation_rate_healthcare', 'baseline_equity_return', 'baseline_cash_return'],
+                  'value': [START_YEAR, projection_years, 'Married Filing Jointly', 0.03, 0.05, 0.07, 0.025]}).to_csv(output_dir / 'config.csv', index=False)
+
+    account_types = ['traditional', 'taxable', 'cash', 'roth']
+    asset_classes = ['equity', 'cash', 'equity', 'custom']
+    pd.DataFrame({
+        'account_name': [f'Account {n + 1}' for n in range(accounts)],
+        'account_type': [account_types[n % len(account_types)] for n in range(accounts)],
+        'balance': split_total(rng, TOTAL_PORTFOLIO, accounts),
+        'asset_class': [asset_classes[(n // len(account_types)) % len(asset_classes)] for n in range(accounts)],
+        'custom_annual_rate': [0.045 if asset_classes[(n // len(account_types)) % len(asset_classes)] == 'custom' else np.nan for n in range(accounts)],
+    }).to_csv(output_dir / 'accounts.csv', index=False)
+
+    pd.DataFrame({
+        'expense_name': [f'Expense {n + 1}' for n in range(expenses)],
+        'start_year': START_YEAR + rng.integers(0, 5, expenses),
+        'end_year': [end_year if n % 3 else START_YEAR + 10 + n % 20 for n in range(expenses)],
+        'annual_amount': split_total(rng, TOTAL_SPENDING, expenses),
+        'inflation_category': ['Healthcare' if n % 4 == 1 else 'General' for n in range(expenses)],
+        'custom_inflation_rate': [0.02 if n % 7 == 6 else np.nan for n in range(expenses)],
+    }).to_csv(output_dir / 'annual_expenses.csv', index=False)
+
+    pd.DataFrame({
+        'stream_name': [f'Stream {n + 1}' for n in range(income_streams)],
+        'annual_amount': split_total(rng, TOTAL_OTHER_INCOME, income_streams),
+        'start_year': START_YEAR + rng.integers(0, 5, income_streams),
+        'end_year': [end_year if n % 2 == 0 else START_YEAR + 15 for n in range(income_streams)],
+        'is_inflation_adjusted': ['TRUE' if n % 2 == 0 else 'FALSE' for n in range(income_streams)],
+    }).to_csv(output_dir / 'income_streams.csv', index=False)
+
+    pd.DataFrame({'person_name': PERSON_NAMES, 'fra_benefit': [36000, 24000], 'fra_age': [67, 67]}).to_csv(output_dir / 'social_security.csv', index=False)
+    return output_dir
+
+# --- Timing Helpers ---
+def call_sampler(function):
+    # Returns sample() -> seconds per call over one timing run. The loop count is picked once by timeit, so short calls are not lost in timer noise.
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return lambda: timer.timeit(number) / number
+
+def fresh_call_sampler(function, make_input):
+    # Like call_sampler, for functions that change their input: every call gets its own copy, made before the clock starts,
+    # so every sample times the same starting state.
+    number, _ = timeit.Timer(lambda: function(make_input())).autorange()
+    def sample():
+        fresh_inputs = [make_input() for _ in range(number)]
+        start = time.perf_counter()
+        for fresh_input in fresh_inputs: function(fresh_input)
+        return (time.perf_counter() - start) / number
+    return sample
+
+def peak_memory_mb(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+def quiet(function):
+    # The engine prints a banner when a household runs out of money; keep it out of the benchmark table.
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()): return function()
+    return run
+
+def prepare_household(input_dir, reference=False):
+    # Returns the household's fixed facts (years simulated, peak memory) and one sampler per timing metric.
+    inputs = model.load_inputs(input_dir, use_cache=False)
+    scenario = BENCHMARK_SCENARIO
+    run_end_to_end = quiet(lambda: model.run_single_scenario(scenario.copy(), engine='array', inputs=inputs))
+    simulated_years = len(run_end_to_end()[1])
+
+    def advance_year():
+        state = model.init_scenario_state(scenario, inputs.config, inputs.model, inputs.social_security)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            while state['year_index'] < state['projection_years']:
+                if model.advance_scenario_year(state): break
+            return (time.perf_counter() - start) / simulated_years
+
+    status = inputs.config['federal_filing_status']
+    schedule = model.compile_tax_schedule(model.scenario_inflation_path(scenario, inputs.config), status)
+    brackets, deduction = model.get_inflated_tax_data(START_YEAR + 10, START_YEAR, float(inputs.config['inflation_rate_general']), status)
+    brokerage_index = inputs.model['type_index']['brokerage']
+
+    # Both withdrawals drain the balances they are given, so each call starts from a fresh copy of the household's accounts.
+    samplers = {
+        'end_to_end_s': call_sampler(run_end_to_end),
+        'load_inputs_s': call_sampler(lambda: model.load_inputs(input_dir, use_cache=False)),
+        'advance_year_s': advance_year,
+        'withdraw_from_group_s': fresh_call_sampler(lambda balance: model.withdraw_from_group(balance, brokerage_index, 1.0), inputs.model['balance'].copy),
+        'schedule_federal_tax_s': call_sampler(lambda: model.schedule_federal_tax(schedule, 10, 150000.0)),
+        'withdraw_from_account_s': fresh_call_sampler(lambda accounts_df: model.withdraw_from_account(accounts_df, 1.0, 'brokerage'), inputs.accounts.copy),
+        'calculate_federal_tax_s': call_sampler(lambda: model.calculate_federal_tax(150000.0, status, brackets, deduction)),
+    }
+    if reference:
+        samplers['reference_end_to_end_s'] = call_sampler(quiet(lambda: model.run_single_scenario(scenario.copy(), engine='dataframe', inputs=inputs)))
+    return {'simulated_years': simulated_years, 'peak_memory_mb': peak_memory_mb(run_end_to_end)}, samplers
+
+def benchmark_cases(dimensions=None, quick=False):
+    cases = []
+    for dimension in dimensions or SCALING_LADDERS:
+        ladder = SCALING_LADDERS[dimension][:QUICK_LADDER_LENGTH] if quick else SCALING_LADDERS[dimension]
+        for size in ladder:
+            cases.append((f"{dimension}={size}", {**BASE_HOUSEHOLD, dimension: size}))
+    return cases
+
+def run_benchmarks(cases, repeat=DEFAULT_REPEAT, reference=False, seed=0):
+    prepared = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for case_name, household in cases:
+            print(f"  - Preparing: {case_name}")
+            input_dir = generate_household(pathlib.Path(work_dir) / case_name.replace('=', '_'), seed=seed, **household)
+            prepared[case_name] = (household, *prepare_household(input_dir, reference))
+        # Each round times every case once, so a metric's repeats are spread over the whole run and share its fast and slow spells.
+        samples = {case_name: {metric: [] for metric in samplers} for case_name, (_, _, samplers) in prepared.items()}
+        for round_number in range(repeat):
+            print(f"  - Timing round {round_number + 1} of {repeat}")
+            for case_name, (_, _, samplers) in prepared.items():
+                for metric, sample in samplers.items(): samples[case_name][metric].append(sample())
+    results = {}
+    for case_name, (household, facts, _) in prepared.items():
+        medians = {metric: float(np.median(values)) for metric, values in samples[case_name].items()}
+        results[case_name] = {'household': household, **facts, **medians, 'scenario_years_per_second': facts['simulated_years'] / medians['end_to_end_s'], 'samples': samples[case_name]}
+    return results
+
+# --- Recording & Comparing Runs ---
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def benchmark_record(results, label):
+    return {
+        'label': label, 'commit': current_commit(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__, 'machine': platform.machine(),
+        'results': results,
+    }
+
+def results_table(results):
+    rows = [{'Case': case_name, 'Years': result['simulated_years'], 'End-to-End (ms)': result['end_to_end_s'] * 1e3,
+             'Scenario-Years/s': result['scenario_years_per_second'], 'Peak Memory (MB)': result['peak_memory_mb'],
+             'Load Inputs (ms)': result['load_inputs_s'] * 1e3, 'Per Year (us)': result['advance_year_s'] * 1e6,
+             'withdraw_from_group (us)': result['withdraw_from_group_s'] * 1e6, 'schedule_federal_tax (us)': result['schedule_federal_tax_s'] * 1e6,
+             'withdraw_from_account (us)': result['withdraw_from_account_s'] * 1e6, 'calculate_federal_tax (us)': result['calculate_federal_tax_s'] * 1e6,
+             **({'Reference (ms)': result['reference_end_to_end_s'] * 1e3} if 'reference_end_to_end_s' in result else {})}
+            for case_name, result in results.items()]
+    return pd.DataFrame(rows)
+
+def compare_records(baseline, current, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """Ratio of every shared timing/memory metric; a ratio above 1 + threshold is flagged as a regression, unless the timing's repeats overlap."""
+    rows = []
+    for case_name, result in current['results'].items():
+        baseline_result = baseline['results'].get(case_name)
+        if baseline_result is None: continue
+        for metric, value in result.items():
+            if not (metric.endswith('_s') or metric.endswith('_mb')) or metric not in baseline_result: continue
+            ratio = value / baseline_result[metric] if baseline_result[metric] else float('inf')
+            current_samples = result.get('samples', {}).get(metric); baseline_samples = baseline_result.get('samples', {}).get(metric)
+            within_noise = bool(current_samples and baseline_samples) and min(current_samples) <= max(baseline_samples)
+            rows.append({'Case': case_name, 'Metric': metric, 'Baseline': baseline_result[metric], 'Current': value,
+                         'Change': ratio - 1, 'Regression': ratio > 1 + threshold and not within_noise})
+    return pd.DataFrame(rows, columns=['Case', 'Metric', 'Baseline', 'Current', 'Change', 'Regression'])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmarks for the retirement simulator on synthetic households.")
+    parser.add_argument('--dimensions', nargs='+', choices=list(SCALING_LADDERS), help="Only scale these dimensions (default: all).")
+    parser.add_argument('--quick', action='store_true', help=f"Only run the first {QUICK_LADDER_LENGTH} sizes of each ladder.")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Timing repeats per measurement; the median is kept and all of them are saved.")
+    parser.add_argument('--reference', action='store_true', help="Also time the pandas reference engine end to end (slow for large households).")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic households.")
+    parser.add_argument('--label', help="Name for this run (default: the current git commit).")
+    parser.add_argument('--output', type=pathlib.Path, help=f"Where to save the results (default: {BENCHMARK_DIR}/<label>.json).")
+    parser.add_argument('--compare', type=pathlib.Path, metavar='BASELINE_JSON', help="Compare against an earlier results file and exit with status 1 on a regression.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD, help="Relative slowdown (or memory growth) that counts as a regression, e.g. 0.10 for 10%%.")
+    args = parser.parse_args()
+    if args.compare and args.repeat < MIN_COMPARE_REPEAT:
+        parser.error(f"--compare needs --repeat {MIN_COMPARE_REPEAT} or more; with fewer repeats, timing noise is reported as regressions.")
+
+    label = args.label or current_commit()
+    cases = benchmark_cases(args.dimensions, args.quick)
+    print(f"Running {len(cases)} benchmark case(s) at commit {current_commit()}...")
+    record = benchmark_record(run_benchmarks(cases, max(1, args.repeat), args.reference, args.seed), label)
+
+    print("\n--- BENCHMARK RESULTS ---")
+    print(results_table(record['results']).to_string(index=False, float_format=lambda value: f'{value:,.2f}'))
+    output_file = args.output or BENCHMARK_DIR / f"{label}.json"
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    output_file.write_text(json.dumps(record, indent=2))
+    print(f"\nBenchmark results saved to {output_file}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        baseline_repeats = min((len(values) for result in baseline['results'].values() for values in result.get('samples', {}).values()), default=0)
+        if baseline_repeats < MIN_COMPARE_REPEAT:
+            print(f"\nWARNING: {args.compare} has only {baseline_repeats} repeat(s) per timing (fewer than {MIN_COMPARE_REPEAT}); its timing regressions are unreliable. Re-record it with --repeat {DEFAULT_REPEAT}.")
+        comparison_df = compare_records(baseline, record, args.threshold)
+        print(f"\n--- COMPARISON WITH {baseline['label']} ({baseline['commit']}), threshold {args.threshold:.0%} ---")
+        display_df = comparison_df.assign(Change=comparison_df['Change'].map('{:+.1%}'.format))
+        print(display_df.to_string(index=False, float_format=lambda value: f'{value:.6g}'))
+        regressions = comparison_df[comparison_df['Regression']]
+        if not regressions.empty:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}.")
+            sys.exit(1)
+        print("\nNo regressions.")
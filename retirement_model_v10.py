@@ -1,15 +1,28 @@
 import pandas as pd
+import numpy as np
 import sys
 import pathlib
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mticker
 import shutil
+import argparse
+import os
+import itertools
+import bisect
+import hashlib
+import pickle
+import json
+import time
+import contextlib
+import asyncio
+from collections import namedtuple, deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # --- Directory and File Path Definitions ---
 INPUT_DIR = pathlib.Path("input_files_v10")
 REPORTS_DIR = pathlib.Path("reports")
 PLOT_DIR = REPORTS_DIR / "plots"
 YEARLY_DIR = REPORTS_DIR / "yearly"
+CACHE_DIR = pathlib.Path(".cache")
+INPUT_CACHE_DIR = CACHE_DIR / "inputs"
 
 # --- Core Financial Logic & Data (Base Year: 2025) ---
 IRS_UNIFORM_LIFETIME_TABLE = {
@@ -67,18 +80,27 @@ SCENARIOS_TO_RUN = [
 ]
 
 # --- Helper Functions ---
+class InputDataError(Exception):
+    # A malformed input file. The command line prints it and stops; batch mode records it against the household and moves on.
+    pass
+
+def exit_on_input_error(loader, *args, **kwargs):
+    try:
+        return loader(*args, **kwargs)
+    except InputDataError as e:
+        print(e)
+        sys.exit()
+
 def validate_dataframe_column(df, column_name, allowed_values, df_name):
     if column_name not in df.columns: return
     allowed_set = set(allowed_values)
     user_values = set(df[column_name].dropna().unique())
     invalid_entries = user_values - allowed_set
     if invalid_entries:
-        print(f"\n--- FATAL INPUT ERROR ---\nInvalid value(s) in '{column_name}' of '{df_name}'.")
-        print(f"Invalid entries: {sorted(list(invalid_entries))}")
-        print(f"Allowed values: {sorted(list(allowed_set))}\n")
-        sys.exit()
+        raise InputDataError(f"\n--- FATAL INPUT ERROR ---\nInvalid value(s) in '{column_name}' of '{df_name}'.\n"
+                             f"Invalid entries: {sorted(list(invalid_entries))}\nAllowed values: {sorted(list(allowed_set))}\n")
 
-def load_data():
+def load_data(input_dir=INPUT_DIR):
     try:
         ALLOWED_ACCOUNT_TYPES = {'cash', 'brokerage', 'traditional', 'roth', 'taxable'}
         ALLOWED_ASSET_CLASSES = {'equity', 'cash', 'custom'}
@@ -91,21 +113,19 @@ def load_data():
         income_column_names = ['stream_name', 'annual_amount', 'start_year', 'end_year', 'is_inflation_adjusted']
         ss_column_names = ['person_name', 'fra_benefit', 'fra_age']
         
-        config_df = pd.read_csv(INPUT_DIR / 'config.csv', names=config_column_names, header=0)
+        config_df = pd.read_csv(input_dir / 'config.csv', names=config_column_names, header=0)
         status_param = 'federal_filing_status'
         filing_status_series = config_df.loc[config_df['parameter'] == status_param, 'value']
         if filing_status_series.empty:
-            print(f"FATAL ERROR: Parameter '{status_param}' not found in config.csv.")
-            sys.exit()
+            raise InputDataError(f"FATAL ERROR: Parameter '{status_param}' not found in config.csv.")
         original_status = filing_status_series.iloc[0]
         clean_status = original_status.strip().lower()
         if clean_status not in ALLOWED_FILING_STATUSES:
-             print(f"\n--- FATAL INPUT ERROR ---\nInvalid value for 'federal_filing_status' in 'config.csv'.")
-             print(f"Found: '{original_status}'. Allowed: {list(ALLOWED_FILING_STATUSES)}\n")
-             sys.exit()
+             raise InputDataError(f"\n--- FATAL INPUT ERROR ---\nInvalid value for 'federal_filing_status' in 'config.csv'.\n"
+                                  f"Found: '{original_status}'. Allowed: {list(ALLOWED_FILING_STATUSES)}\n")
         config_df.loc[config_df['parameter'] == status_param, 'value'] = clean_status
         
-        accounts_df = pd.read_csv(INPUT_DIR / 'accounts.csv', names=account_column_names, header=0, dtype={'custom_annual_rate': float})
+        accounts_df = pd.read_csv(input_dir / 'accounts.csv', names=account_column_names, header=0, dtype={'custom_annual_rate': float})
         accounts_df['account_type'] = accounts_df['account_type'].str.strip().str.lower()
         validate_dataframe_column(accounts_df, 'account_type', ALLOWED_ACCOUNT_TYPES, 'accounts.csv')
         
@@ -113,13 +133,12 @@ def load_data():
             accounts_df['asset_class'] = accounts_df['asset_class'].str.strip().str.lower()
             validate_dataframe_column(accounts_df, 'asset_class', ALLOWED_ASSET_CLASSES, 'accounts.csv')
         else:
-            print(f"FATAL ERROR: The required column 'asset_class' is missing from accounts.csv.")
-            sys.exit()
+            raise InputDataError(f"FATAL ERROR: The required column 'asset_class' is missing from accounts.csv.")
         
-        income_df = pd.read_csv(INPUT_DIR / 'income_streams.csv', names=income_column_names, header=0, dtype={'annual_amount': float})
-        ss_df = pd.read_csv(INPUT_DIR / 'social_security.csv', names=ss_column_names, header=0, dtype={'fra_benefit': float})
+        income_df = pd.read_csv(input_dir / 'income_streams.csv', names=income_column_names, header=0, dtype={'annual_amount': float})
+        ss_df = pd.read_csv(input_dir / 'social_security.csv', names=ss_column_names, header=0, dtype={'fra_benefit': float})
         
-        expenses_df = pd.read_csv(INPUT_DIR / 'annual_expenses.csv', names=expense_column_names, header=0, dtype={'annual_amount': float})
+        expenses_df = pd.read_csv(input_dir / 'annual_expenses.csv', names=expense_column_names, header=0, dtype={'annual_amount': float})
         if 'inflation_category' in expenses_df.columns:
             expenses_df['inflation_category'] = expenses_df['inflation_category'].str.strip().str.lower()
             validate_dataframe_column(expenses_df, 'inflation_category', ALLOWED_INFLATION_CATEGORIES, 'annual_expenses.csv')
@@ -132,9 +151,8 @@ def load_data():
         config_df = config_df.set_index('parameter')['value']
         accounts_df['account_type'] = accounts_df['account_type'].replace('taxable', 'brokerage')
         return config_df, accounts_df, income_df, ss_df, expenses_df
-    except (FileNotFoundError, ValueError, KeyError) as e:
-        print(f"FATAL ERROR in loading data. Check your CSV files in '{INPUT_DIR}'. Error: {e}")
-        sys.exit()
+    except (FileNotFoundError, ValueError, KeyError, AttributeError) as e:
+        raise InputDataError(f"FATAL ERROR in loading data. Check your CSV files in '{input_dir}'. Error: {e}") from e
 
 def calculate_ss_benefit(fra_benefit, fra_age, claim_age):
     if claim_age == fra_age: return fra_benefit
@@ -164,48 +182,80 @@ def calculate_federal_tax(taxable_income, filing_status, brackets, deduction):
     return tax
 
 def withdraw_from_account(accounts_df, amount, acc_type):
-    balance = accounts_df.loc[accounts_df['account_type'] == acc_type, 'balance'].sum()
+    type_mask = accounts_df['account_type'] == acc_type
+    balance = accounts_df.loc[type_mask, 'balance'].sum()
     withdrawal_amount = min(amount, balance)
     if balance > 0:
-        proportions = (accounts_df.loc[accounts_df['account_type'] == acc_type, 'balance'] / balance).fillna(0)
-        accounts_df.loc[accounts_df['account_type'] == acc_type, 'balance'] -= withdrawal_amount * proportions
+        proportions = (accounts_df.loc[type_mask, 'balance'] / balance).fillna(0)
+        accounts_df.loc[type_mask, 'balance'] -= withdrawal_amount * proportions
     return withdrawal_amount
 
+PLOT_FIGURES = {}
+OVERLAY_LEGEND_LIMIT = 12
+
+def safe_filename(name):
+    return "".join([c for c in name if c.isalpha() or c.isdigit() or c==' ']).rstrip()
+
+def load_pyplot():
+    # matplotlib is only imported once there is something to draw, and always with the file-only Agg backend.
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def reusable_axes(chart_kind):
+    # Each process keeps one figure per kind of chart and redraws it, rather than building and tearing down a figure per PNG.
+    if chart_kind not in PLOT_FIGURES:
+        fig, ax = load_pyplot().subplots(figsize=(12, 8))
+        PLOT_FIGURES[chart_kind] = (fig, ax, {side: getattr(fig.subplotpars, side) for side in ['left', 'right', 'bottom', 'top']})
+    fig, ax, margins = PLOT_FIGURES[chart_kind]
+    ax.clear()
+    fig.subplots_adjust(**margins)  # tight_layout starts from the previous chart's margins otherwise
+    return fig, ax
+
+def finish_dollar_chart(fig, ax, title, ylabel, output_file, legend_loc='best'):
+    from matplotlib.ticker import FuncFormatter
+    ax.set_title(title, fontsize=16)
+    ax.set_xlabel('Year', fontsize=12)
+    ax.set_ylabel(ylabel, fontsize=12)
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'${x:,.0f}'))
+    if legend_loc is not None: ax.legend(fontsize=12, loc=legend_loc)
+    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
+    fig.tight_layout()
+    fig.savefig(output_file)
+
 def plot_financial_overview(df, scenario_name, output_dir):
-    fig, ax = plt.subplots(figsize=(12, 8))
+    fig, ax = reusable_axes('overview')
     ax.plot(df['Year'], df['Total Expenses'], label='Annual Expenses', color='red', marker='o', markersize=4)
     ax.plot(df['Year'], df['Total Savings'], label='Total Savings', color='green', marker='o', markersize=4)
-    ax.set_title(f'Financial Overview: {scenario_name}', fontsize=16)
-    ax.set_xlabel('Year', fontsize=12)
-    ax.set_ylabel('Amount ($)', fontsize=12)
-    formatter = mticker.FuncFormatter(lambda x, p: f'${x:,.0f}')
-    ax.yaxis.set_major_formatter(formatter)
-    ax.legend(fontsize=12)
-    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
-    plt.tight_layout()
-    safe_filename = "".join([c for c in scenario_name if c.isalpha() or c.isdigit() or c==' ']).rstrip()
-    plt.savefig(output_dir / f'{safe_filename}_overview.png')
-    plt.close(fig)
+    finish_dollar_chart(fig, ax, f'Financial Overview: {scenario_name}', 'Amount ($)', output_dir / f'{safe_filename(scenario_name)}_overview.png')
 
 def plot_savings_breakdown(df, scenario_name, output_dir):
-    fig, ax = plt.subplots(figsize=(12, 8))
+    fig, ax = reusable_axes('composition')
     labels = ['Cash', 'Brokerage', 'Traditional', 'Roth']
     colors = ['#c7c7c7', '#4c72b0', '#dd8452', '#55a868']
     ax.stackplot(df['Year'], df['Cash Balance'], df['Brokerage Balance'], df['Traditional Balance'], df['Roth Balance'], labels=labels, colors=colors)
-    ax.set_title(f'Portfolio Composition: {scenario_name}', fontsize=16)
-    ax.set_xlabel('Year', fontsize=12)
-    ax.set_ylabel('Portfolio Value ($)', fontsize=12)
-    formatter = mticker.FuncFormatter(lambda x, p: f'${x:,.0f}')
-    ax.yaxis.set_major_formatter(formatter)
-    ax.legend(fontsize=12, loc='upper left')
-    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
-    plt.tight_layout()
-    safe_filename = "".join([c for c in scenario_name if c.isalpha() or c.isdigit() or c==' ']).rstrip()
-    plt.savefig(output_dir / f'{safe_filename}_composition.png')
-    plt.close(fig)
+    finish_dollar_chart(fig, ax, f'Portfolio Composition: {scenario_name}', 'Portfolio Value ($)', output_dir / f'{safe_filename(scenario_name)}_composition.png', legend_loc='upper left')
+
+def plot_percentile_fan(bands_df, scenario_name, output_dir):
+    # One chart per Monte Carlo scenario: nested percentile bands of Total Savings around the median path.
+    fig, ax = reusable_axes('fan')
+    for lower, upper, alpha in [(5, 95, 0.2), (25, 75, 0.4)]:
+        ax.fill_between(bands_df['Year'], bands_df[f'P{lower} Total Savings'], bands_df[f'P{upper} Total Savings'], color='green', alpha=alpha, linewidth=0, label=f'P{lower}-P{upper}')
+    ax.plot(bands_df['Year'], bands_df['P50 Total Savings'], color='green', marker='o', markersize=4, label='Median')
+    finish_dollar_chart(fig, ax, f'Total Savings Percentiles: {scenario_name}', 'Total Savings ($)', output_dir / f'{safe_filename(scenario_name)}_savings_fan.png', legend_loc='upper left')
+
+def plot_scenario_overlay(metric_df, metric, output_file):
+    # Every scenario's path of one metric on shared axes; the legend is dropped once there are too many lines to label.
+    fig, ax = reusable_axes('overlay')
+    many = len(metric_df.columns) > OVERLAY_LEGEND_LIMIT
+    for scenario_name in metric_df.columns:
+        ax.plot(metric_df.index, metric_df[scenario_name], label=scenario_name, linewidth=0.6 if many else 1.5, alpha=0.4 if many else 1.0)
+    finish_dollar_chart(fig, ax, f'{metric}: {len(metric_df.columns)} Scenarios', f'{metric} ($)', output_file, legend_loc=None if many else 'upper left')
 
-def run_single_scenario(scenario_config):
-    config_df, accounts_df, income_df, ss_df, expenses_df = load_data()
+def run_single_scenario_dataframe(scenario_config, inputs=None):
+    if inputs is None: config_df, accounts_df, income_df, ss_df, expenses_df = load_data()
+    else: config_df, accounts_df, income_df, ss_df, expenses_df = (df.copy() for df in inputs[:5])
     initial_portfolio_value = accounts_df['balance'].sum()
     if 'custom_inflation_rate' not in expenses_df.columns: expenses_df['custom_inflation_rate'] = pd.NA
     expenses_df['custom_inflation_rate'] = pd.to_numeric(expenses_df['custom_inflation_rate'], errors='coerce')
@@ -383,21 +433,1558 @@ def run_single_scenario(scenario_config):
     details_df = pd.DataFrame(yearly_data_list)
     return summary, details_df
 
+# --- Compiled Tax Schedule ---
+# Inflated bracket edges, cumulative tax at each edge and the standard deduction for every projection year, built once per scenario.
+# A 1-D inflation path also keeps per-year Python lists, so scalar lookups reproduce calculate_federal_tax exactly.
+# A (paths x years) inflation path evaluates whole arrays of incomes at once; every row is one path.
+# price_level picks how year n's brackets are indexed, in either form:
+#   'year_rate'  - (1 + year n's rate) ** n, the rule the yearly engine has always used; default for a 1-D path.
+#   'compounded' - the product of (1 + rate) over years 1..n, the price level expenses follow; default for (paths x years).
+# On a constant-rate path the two agree. Random paths (Monte Carlo, backtest) use 'compounded', since 'year_rate' swings with every
+# single year's draw; a batch of deterministic scenarios passes 'year_rate' so each row reproduces its scalar run.
+# 'compat' reproduces earlier results; 'gross_up' also taxes the traditional withdrawals that pay the tax bill.
+TAX_MODE = 'compat'
+
+def cumulative_bracket_tax(lower_edges, upper_edges, rates):
+    cumulative = [0]; tax = 0
+    for lower, upper, rate in zip(lower_edges[:-1], upper_edges[:-1], rates[:-1]):
+        tax += (upper - lower) * rate; cumulative.append(tax)
+    return cumulative
+
+def compile_tax_schedule(inflation_by_year, filing_status, price_level=None):
+    bracket_items = list(BASE_FEDERAL_TAX_BRACKETS[filing_status.title()].items())
+    rate_keys = [rate for rate, _ in bracket_items]
+    base_lower = [lower for _, (lower, _) in bracket_items]; base_upper = [upper for _, (_, upper) in bracket_items]
+    base_deduction = BASE_FEDERAL_STANDARD_DEDUCTION[filing_status.title()]
+    inflation_by_year = np.asarray(inflation_by_year, dtype=float)
+    schedule = {
+        'rate_keys': rate_keys, 'rates': np.array(rate_keys), 'base_deduction': base_deduction,
+        'base_lower': np.array(base_lower, dtype=float), 'base_upper': np.array(base_upper, dtype=float),
+        'base_cumulative': np.array(cumulative_bracket_tax(base_lower, base_upper, rate_keys), dtype=float),
+    }
+    if price_level is None: price_level = 'year_rate' if inflation_by_year.ndim == 1 else 'compounded'
+    if price_level == 'year_rate':
+        schedule['factor'] = (1 + inflation_by_year) ** np.arange(inflation_by_year.shape[-1])
+    elif price_level == 'compounded':
+        growth = np.concatenate([np.ones(inflation_by_year.shape[:-1] + (1,)), 1 + inflation_by_year[..., 1:]], axis=-1)
+        schedule['factor'] = np.cumprod(growth, axis=-1)
+    else: raise ValueError(f"Unknown price_level '{price_level}'; expected 'year_rate' or 'compounded'.")
+    if inflation_by_year.ndim == 1:
+        factors = schedule['factor'].tolist()
+        schedule['year_lower'] = [[lower * f for lower in base_lower] for f in factors]
+        schedule['year_upper'] = [[upper * f for upper in base_upper] for f in factors]
+        schedule['year_cumulative'] = [cumulative_bracket_tax(lower, upper, rate_keys) for lower, upper in zip(schedule['year_lower'], schedule['year_upper'])]
+        schedule['year_deduction'] = [base_deduction * f for f in factors]
+    # Knots of the piecewise-linear tax curve (taxable income after deduction, base-year dollars) and the marginal rate after each knot.
+    # The 1-dollar gaps between the bracket tables' edges are taxed at 0%, just as calculate_federal_tax treats them.
+    knots = [0.0]; slopes = [rate_keys[0]]
+    for k in range(1, len(rate_keys)):
+        knots += [base_upper[k - 1], base_lower[k]]; slopes += [0.0, rate_keys[k]]
+    schedule['knots'] = np.array(knots); schedule['knot_slopes'] = np.array(slopes)
+    schedule['knot_tax'] = normalized_schedule_tax(schedule, schedule['knots'])
+    return schedule
+
+def normalized_schedule_tax(schedule, taxable_income_after_deduction):
+    k = np.searchsorted(schedule['base_lower'], taxable_income_after_deduction, side='left') - 1
+    kk = np.maximum(k, 0)
+    tax = schedule['base_cumulative'][kk] + (np.minimum(taxable_income_after_deduction, schedule['base_upper'][kk]) - schedule['base_lower'][kk]) * schedule['rates'][kk]
+    return np.where(k >= 0, tax, 0.0)
+
+def schedule_federal_tax(schedule, i, taxable_income):
+    if 'year_lower' in schedule and np.ndim(taxable_income) == 0:
+        taxable_income_after_deduction = max(0, taxable_income - schedule['year_deduction'][i])
+        lower = schedule['year_lower'][i]
+        k = bisect.bisect_left(lower, taxable_income_after_deduction) - 1
+        if k < 0: return 0
+        return schedule['year_cumulative'][i][k] + (min(taxable_income_after_deduction, schedule['year_upper'][i][k]) - lower[k]) * schedule['rate_keys'][k]
+    factor = schedule['factor'][..., i]
+    normalized_income = np.maximum(0, taxable_income - schedule['base_deduction'] * factor) / factor
+    return factor * normalized_schedule_tax(schedule, normalized_income)
+
+def schedule_bracket_floor(schedule, i, rate):
+    if rate not in schedule['rate_keys']: return float('inf')
+    k = schedule['rate_keys'].index(rate)
+    if 'year_lower' in schedule: return schedule['year_lower'][i][k]
+    return schedule['base_lower'][k] * schedule['factor'][..., i]
+
+def schedule_bracket_room(schedule, i, rate, taxable_income):
+    # Additional ordinary income that still lands in bracket `rate`, given income before the standard deduction.
+    if rate not in schedule['rate_keys']: return 0
+    k = schedule['rate_keys'].index(rate)
+    if 'year_upper' in schedule and np.ndim(taxable_income) == 0:
+        return max(0, schedule['year_upper'][i][k] - (taxable_income - schedule['year_deduction'][i]))
+    factor = schedule['factor'][..., i]
+    return np.maximum(0, schedule['base_upper'][k] * factor - (taxable_income - schedule['base_deduction'] * factor))
+
+def schedule_gross_up(schedule, i, base_income, net_amount):
+    # Exact inverse of the tax curve: extra ordinary income W on top of `base_income` such that W - (tax(base + W) - tax(base)) = net_amount.
+    factor = schedule['factor'][i] if 'year_lower' in schedule else schedule['factor'][..., i]
+    base = np.asarray(base_income, dtype=float) / factor - schedule['base_deduction']
+    net = np.asarray(net_amount, dtype=float) / factor
+    base_tax = normalized_schedule_tax(schedule, np.maximum(base, 0))
+    knots = schedule['knots']
+    extra_income = np.maximum(knots - base[..., None], 0)
+    net_at_knot = extra_income - (np.where(knots > base[..., None], schedule['knot_tax'], base_tax[..., None]) - base_tax[..., None])
+    segment = (net_at_knot <= net[..., None]).sum(axis=-1) - 1
+    start_income = np.where(segment >= 0, np.take_along_axis(extra_income, np.maximum(segment, 0)[..., None], -1)[..., 0], 0)
+    start_net = np.where(segment >= 0, np.take_along_axis(net_at_knot, np.maximum(segment, 0)[..., None], -1)[..., 0], 0)
+    slope = np.where(segment >= 0, schedule['knot_slopes'][np.maximum(segment, 0)], 0)
+    gross = np.where(net > 0, start_income + (net - start_net) / (1 - slope), 0) * factor
+    return float(gross) if np.ndim(gross) == 0 else gross
+
+def ss_taxable_share(schedule, i, magi):
+    floor_22 = schedule_bracket_floor(schedule, i, 0.22); floor_12 = schedule_bracket_floor(schedule, i, 0.12)
+    if np.ndim(magi) == 0 and np.ndim(floor_22) == 0:
+        if magi > floor_22: return 0.85
+        elif magi > floor_12: return 0.50
+        return 0
+    return np.where(magi > floor_22, 0.85, np.where(magi > floor_12, 0.50, 0))
+
+# --- Opt-in Profiling ---
+# PROFILER stays None unless enable_profiling() is called, so every probe in the hot path is a single `is not None` check.
+# Phases are recorded per scenario as running totals and, up to PROFILE_MAX_EVENTS, as individual Chrome-trace spans.
+PROFILER = None
+PROFILE_MAX_EVENTS = 500_000
+
+def enable_profiling():
+    global PROFILER
+    PROFILER = {'scenario': '', 'totals': {}, 'counters': {}, 'events': []}
+    return PROFILER
+
+def record_phase(profiler, phase, start, end, scenario=None):
+    key = (profiler['scenario'] if scenario is None else scenario, phase)
+    total = profiler['totals'].get(key)
+    if total is None: profiler['totals'][key] = [end - start, 1]
+    else: total[0] += end - start; total[1] += 1
+    if len(profiler['events']) < PROFILE_MAX_EVENTS: profiler['events'].append((phase, key[0], start, end, os.getpid()))
+
+def profile_lap(profiler, phase, started):
+    # Closes the phase that began at `started` and returns the clock reading, which starts the next phase.
+    now = time.perf_counter()
+    record_phase(profiler, phase, started, now)
+    return now
+
+def profile_count(profiler, counter, amount=1):
+    key = (profiler['scenario'], counter)
+    profiler['counters'][key] = profiler['counters'].get(key, 0) + amount
+
+@contextlib.contextmanager
+def profile_phase(phase, scenario=None):
+    profiler = PROFILER
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try: yield
+    finally: record_phase(profiler, phase, start, time.perf_counter(), scenario)
+
+def take_profile(profiler):
+    # Hands a worker's measurements back to the parent process and starts the worker afresh.
+    data = {key: profiler[key] for key in ['totals', 'counters', 'events']}
+    profiler.update({'totals': {}, 'counters': {}, 'events': []})
+    return data
+
+def merge_profile(profiler, data):
+    for key, (seconds, calls) in data['totals'].items():
+        total = profiler['totals'].setdefault(key, [0.0, 0])
+        total[0] += seconds; total[1] += calls
+    for key, value in data['counters'].items(): profiler['counters'][key] = profiler['counters'].get(key, 0) + value
+    profiler['events'].extend(data['events'][:max(0, PROFILE_MAX_EVENTS - len(profiler['events']))])
+
+def profile_breakdown(profiler):
+    rows = [{'Scenario': scenario, 'Phase': phase, 'Calls': calls, 'Total (ms)': seconds * 1e3, 'Mean (us)': seconds / calls * 1e6}
+            for (scenario, phase), (seconds, calls) in profiler['totals'].items()]
+    breakdown_df = pd.DataFrame(rows, columns=['Scenario', 'Phase', 'Calls', 'Total (ms)', 'Mean (us)'])
+    breakdown_df['Share of Scenario'] = breakdown_df['Total (ms)'] / breakdown_df.groupby('Scenario')['Total (ms)'].transform('sum')
+    counters_df = pd.DataFrame([{'Scenario': scenario, 'Phase': f"count: {counter}", 'Calls': value} for (scenario, counter), value in profiler['counters'].items()], columns=['Scenario', 'Phase', 'Calls'])
+    breakdown_df = breakdown_df.sort_values(['Scenario', 'Total (ms)'], ascending=[True, False], kind='stable')
+    return pd.concat([breakdown_df, counters_df.sort_values(['Scenario', 'Phase'])], ignore_index=True)
+
+def write_chrome_trace(profiler, output_file):
+    # Complete ('X') events in microseconds, one track per process; open the file in chrome://tracing or ui.perfetto.dev.
+    events = profiler['events']
+    origin = min((event[2] for event in events), default=0.0)
+    trace_events = [{'name': phase, 'cat': 'simulation', 'ph': 'X', 'ts': (start - origin) * 1e6, 'dur': (end - start) * 1e6, 'pid': pid, 'tid': 0, 'args': {'scenario': scenario}}
+                    for phase, scenario, start, end, pid in events]
+    trace_events += [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': 'main' if pid == os.getpid() else f'worker {pid}'}}
+                     for pid in sorted({event[4] for event in events})]
+    with open(output_file, 'w') as f: json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+# --- Array-Backed Simulation Engine ---
+# 'array' is the default engine; 'dataframe' keeps the original pandas implementation as a reference.
+SIMULATION_ENGINE = 'array'
+ACCOUNT_TYPES = ['cash', 'brokerage', 'traditional', 'roth']
+
+def sequential_sum(values):
+    # Left-to-right accumulation, matching the `total += value` loops of the reference engine bit for bit.
+    return np.cumsum(values)[-1] if len(values) else 0
+
+def build_model_arrays(accounts_df, income_df, expenses_df):
+    account_types = accounts_df['account_type'].to_numpy()
+    asset_classes = accounts_df['asset_class'].to_numpy()
+    custom_inflation = pd.to_numeric(expenses_df['custom_inflation_rate'], errors='coerce').to_numpy(dtype=float)
+    model = {
+        'balance': accounts_df['balance'].fillna(0.0).to_numpy(dtype=float),
+        'is_equity': asset_classes == 'equity', 'is_cash_asset': asset_classes == 'cash',
+        'custom_annual_rate': accounts_df['custom_annual_rate'].to_numpy(dtype=float),
+        'type_index': {acc_type: np.flatnonzero(account_types == acc_type) for acc_type in ACCOUNT_TYPES},
+        'liquid_index': np.flatnonzero(np.isin(account_types, ['cash', 'brokerage'])),
+        'expense_names': expenses_df['expense_name'].tolist(),
+        'expense_amount': expenses_df['annual_amount'].fillna(0.0).to_numpy(dtype=float),
+        'expense_start': expenses_df['start_year'].to_numpy(dtype=float), 'expense_end': expenses_df['end_year'].to_numpy(dtype=float),
+        'expense_custom_rate': custom_inflation, 'expense_has_custom_rate': ~np.isnan(custom_inflation),
+        'expense_is_healthcare': (expenses_df['inflation_category'] == 'healthcare').to_numpy(dtype=bool),
+        'pension_amount': income_df['annual_amount'].fillna(0.0).to_numpy(dtype=float),
+        'pension_start': income_df['start_year'].to_numpy(dtype=float), 'pension_end': income_df['end_year'].to_numpy(dtype=float),
+        'pension_indexed': np.array([bool(value) for value in income_df['is_inflation_adjusted']], dtype=bool),
+    }
+    for key, value in model.items():
+        if isinstance(value, np.ndarray): value.flags.writeable = False
+    return model
+
+def account_growth_rates(model, stock_return, cash_return):
+    return np.where(model['is_equity'], stock_return, np.where(model['is_cash_asset'], cash_return, model['custom_annual_rate']))
+
+def withdraw_from_group(balance, index, amount):
+    group_balance = balance[index]
+    total = group_balance.sum()
+    withdrawal_amount = min(amount, total)
+    if total > 0:
+        balance[index] = group_balance - withdrawal_amount * (group_balance / total)
+    return withdrawal_amount
+
+RESULT_METRICS = ['Year', '{0} (age)', '{1} (age)', 'AGI_Proxy', 'MAGI', 'Accounts Income', 'Pension Income', 'Total SS', '{0} SS', '{1} SS',
+                  'Total Expenses', 'Roth Conversion', 'RMD', 'Final Taxable Income', 'Tax Ordinary Income', 'Federal Taxes', 'IRMAA',
+                  'Total Savings', 'Cash Balance', 'Brokerage Balance', 'Traditional Balance', 'Roth Balance']
+
+def build_result_schema(person_names, expense_names):
+    # Each year's values are gathered as RESULT_METRICS followed by one value per expense line. A name that repeats keeps its first
+    # column but takes its last value, which is what the per-year dict this replaces did when an expense shared a column's name.
+    names = [metric.format(*person_names) for metric in RESULT_METRICS] + list(expense_names)
+    metrics = list(dict.fromkeys(names))
+    last_source = {name: n for n, name in enumerate(names)}
+    return {'metrics': metrics, 'sources': np.array([last_source[name] for name in metrics]), 'magi_column': metrics.index('MAGI')}
+
+def results_frame(rows, metrics):
+    return pd.DataFrame(np.asarray(rows).astype(np.int64), columns=metrics)
+
+def scenario_inflation_path(scenario_config, config_df):
+    historical_sequence = list(scenario_config['historical_data'].values()) if scenario_config.get('historical_data') else []
+    baseline_inf_general = float(scenario_config.get('inflation_rate_general', config_df['inflation_rate_general']))
+    return [historical_sequence[i][1] if i < len(historical_sequence) else baseline_inf_general for i in range(int(config_df['projection_years']))]
+
+def init_scenario_state(scenario_config, config_df, model, ss_df, tax_schedule=None):
+    ss_data = ss_df.set_index('person_name').to_dict('index')
+    person_names = list(ss_data.keys())[:2]
+    ss_age_keys = [f"{name}_ss_age" for name in person_names]
+    historical_data = scenario_config.get('historical_data')
+    if tax_schedule is None: tax_schedule = compile_tax_schedule(scenario_inflation_path(scenario_config, config_df), config_df['federal_filing_status'])
+    result_schema = build_result_schema(person_names, model['expense_names'])
+    return {
+        'scenario': scenario_config, 'model': model, 'tax_schedule': tax_schedule, 'tax_mode': scenario_config.get('tax_mode', TAX_MODE),
+        'start_year': int(config_df['start_year']), 'projection_years': int(config_df['projection_years']),
+        'filing_status': config_df['federal_filing_status'],
+        'historical_sequence': list(historical_data.values()) if historical_data else [],
+        'baseline_inf_general': float(scenario_config.get('inflation_rate_general', config_df['inflation_rate_general'])),
+        'baseline_inf_health': float(scenario_config.get('inflation_rate_healthcare', config_df['inflation_rate_healthcare'])),
+        'baseline_equity_return': float(config_df['baseline_equity_return']), 'baseline_cash_return': float(config_df['baseline_cash_return']),
+        'person_names': person_names, 'ss_age_keys': ss_age_keys,
+        'ss_benefits': [calculate_ss_benefit(ss_data[name]['fra_benefit'], ss_data[name]['fra_age'], scenario_config[key]) for name, key in zip(person_names, ss_age_keys)],
+        'balance': model['balance'].copy(), 'expense_amount': model['expense_amount'].copy(), 'pension_amount': model['pension_amount'].copy(),
+        'initial_portfolio_value': model['balance'].sum(),
+        'result_schema': result_schema, 'results': np.full((int(config_df['projection_years']), len(result_schema['metrics'])), np.nan),
+        'total_taxes_paid': 0, 'total_irmaa_paid': 0, 'year_index': 0, 'depleted_year': None,
+    }
+
+def advance_scenario_year(state):
+    scenario_config = state['scenario']; model = state['model']; balance = state['balance']; type_index = model['type_index']; tax_schedule = state['tax_schedule']
+    i = state['year_index']; start_year = state['start_year']
+    current_year = start_year + i
+    current_age = 63 + i
+    profiler = PROFILER
+    if profiler is not None: lap = time.perf_counter()
+
+    if i < len(state['historical_sequence']):
+        year_stock_return, year_inflation, year_cash_return = state['historical_sequence'][i]
+        inf_general = year_inflation
+        inf_health = year_inflation
+    else:
+        year_stock_return = state['baseline_equity_return']
+        year_cash_return = state['baseline_cash_return']
+        inf_general = state['baseline_inf_general']
+        inf_health = state['baseline_inf_health']
+
+    expense_amount = state['expense_amount']
+    expense_rates = np.where(model['expense_has_custom_rate'], model['expense_custom_rate'], np.where(model['expense_is_healthcare'], inf_health, inf_general))
+    inflating = current_year > model['expense_start']
+    expense_amount[inflating] *= 1 + expense_rates[inflating]
+    if profiler is not None: lap = profile_lap(profiler, 'expense_inflation', lap)
+
+    ss_benefits = state['ss_benefits']
+    for p, key in enumerate(state['ss_age_keys']):
+        if current_age > scenario_config[key]: ss_benefits[p] *= (1 + inf_general)
+    pension_amount = state['pension_amount']
+    pension_amount[model['pension_indexed'] & (current_year > model['pension_start'])] *= (1 + inf_general)
+    if profiler is not None: lap = profile_lap(profiler, 'pension_indexing', lap)
+
+    results = state['results']; result_schema = state['result_schema']
+    irmaa_surcharge = 0
+    if current_year >= 2027 and i >= 2:
+        magi_prev = results[i-2, result_schema['magi_column']]
+        for bracket in MEDICARE_IRMAA_BRACKETS:
+            if magi_prev > bracket['threshold']:
+                irmaa_surcharge = (bracket['part_b_surcharge'] + bracket['part_d_surcharge']) * 2 * 12
+                break
+    state['total_irmaa_paid'] += irmaa_surcharge
+    if profiler is not None: lap = profile_lap(profiler, 'irmaa_lookback', lap)
+
+    start_of_year_balance = balance.copy()
+    prior_trad_bal = start_of_year_balance[type_index['traditional']].sum()
+    if profiler is not None: lap = profile_lap(profiler, 'start_of_year_copy', lap)
+
+    pension_active = (model['pension_start'] <= current_year) & (model['pension_end'] >= current_year)
+    pension_income = pension_amount[pension_active].sum()
+    roth_conversion_amount = 0
+    if current_year <= scenario_config.get('roth_end_year', 0):
+        if scenario_config.get('roth_strategy') in ('fixed_amount', 'till_2028'):
+            roth_conversion_amount = scenario_config.get('roth_amount', 0)
+        elif scenario_config.get('roth_strategy') == 'fill_bracket':
+            roth_conversion_amount = schedule_bracket_room(tax_schedule, i, scenario_config.get('roth_target_bracket_rate', 0), pension_income)
+
+    if roth_conversion_amount > 0:
+        roth_conversion_amount = max(0, min(roth_conversion_amount, prior_trad_bal))
+        withdraw_from_group(balance, type_index['traditional'], roth_conversion_amount)
+        balance[type_index['roth']] += roth_conversion_amount
+    if profiler is not None: lap = profile_lap(profiler, 'roth_conversion', lap)
+
+    growth_rates = account_growth_rates(model, year_stock_return, year_cash_return)
+    balance *= 1 + growth_rates
+    liquid_index = model['liquid_index']
+    income_on_accounts = sequential_sum(start_of_year_balance[liquid_index] * growth_rates[liquid_index])
+    if profiler is not None: lap = profile_lap(profiler, 'account_growth', lap)
+
+    person_payments = [benefit if current_age >= scenario_config[key] else 0 for benefit, key in zip(ss_benefits, state['ss_age_keys'])]
+    ss_income = person_payments[0] + person_payments[1]
+
+    rmd_amount = 0
+    if current_age >= 75: rmd_amount = prior_trad_bal / IRS_UNIFORM_LIFETIME_TABLE.get(current_age, 8.9)
+
+    expense_active = (model['expense_start'] <= current_year) & (model['expense_end'] >= current_year)
+    year_expenses = expense_amount[expense_active].sum()
+    year_expenses += irmaa_surcharge
+    cash_needed_for_spending = max(0, year_expenses - (pension_income + ss_income))
+
+    non_retirement_cash = balance[liquid_index].sum()
+    if state['tax_mode'] == 'gross_up':
+        # Size the traditional withdrawal so that, after its own tax, it covers whatever the liquid accounts cannot.
+        # The Social Security share only ever steps up as the withdrawal grows, so this settles within its three tiers.
+        traditional_available = balance[type_index['traditional']].sum(); ss_share = 0
+        for _ in range(3):
+            base_taxable_income = pension_income + roth_conversion_amount + income_on_accounts + ss_income * ss_share
+            shortfall = max(0, cash_needed_for_spending + schedule_federal_tax(tax_schedule, i, base_taxable_income) - non_retirement_cash)
+            traditional_withdrawal = max(rmd_amount, min(schedule_gross_up(tax_schedule, i, base_taxable_income, shortfall), traditional_available))
+            new_share = ss_taxable_share(tax_schedule, i, pension_income + roth_conversion_amount + traditional_withdrawal + income_on_accounts + ss_income)
+            if new_share == ss_share: break
+            ss_share = new_share
+    else:
+        traditional_withdrawal = 0
+        if cash_needed_for_spending > 0:
+            traditional_withdrawal = max(0, cash_needed_for_spending - non_retirement_cash)
+        traditional_withdrawal = max(rmd_amount, traditional_withdrawal)
+
+    AGI_Proxy = pension_income + roth_conversion_amount + traditional_withdrawal + income_on_accounts
+    MAGI = AGI_Proxy + ss_income
+    final_taxable_income = AGI_Proxy + ss_income * ss_taxable_share(tax_schedule, i, MAGI)
+
+    tax_from_ordinary_income = schedule_federal_tax(tax_schedule, i, final_taxable_income)
+    federal_tax = tax_from_ordinary_income; state['total_taxes_paid'] += federal_tax
+    cash_needed_from_portfolio = cash_needed_for_spending + federal_tax
+    if profiler is not None: lap = profile_lap(profiler, 'tax', lap)
+
+    withdrawn_so_far = 0
+    for acc_type in ['cash', 'brokerage', 'traditional', 'roth']:
+        needed = cash_needed_from_portfolio - withdrawn_so_far
+        if needed <= 0: break
+        withdrawn_so_far += withdraw_from_group(balance, type_index[acc_type], needed)
+    if profiler is not None: lap = profile_lap(profiler, 'withdrawals', lap)
+
+    year_values = np.concatenate(([
+        current_year, current_age, current_age, AGI_Proxy, MAGI, income_on_accounts, pension_income, ss_income,
+        person_payments[0], person_payments[1], year_expenses, roth_conversion_amount, rmd_amount, final_taxable_income, tax_from_ordinary_income, federal_tax, irmaa_surcharge,
+        balance.sum(), balance[type_index['cash']].sum(), balance[type_index['brokerage']].sum(), balance[type_index['traditional']].sum(), balance[type_index['roth']].sum(),
+    ], np.where(expense_active, expense_amount, 0)))
+    results[i] = np.round(year_values[result_schema['sources']])
+    if profiler is not None:
+        profile_lap(profiler, 'row_building', lap); profile_count(profiler, 'years')
+
+    state['year_index'] = i + 1
+    if withdrawn_so_far < cash_needed_from_portfolio - 1:
+        state['depleted_year'] = current_year
+        return True
+    return False
+
+def summarize_scenario_state(state):
+    scenario_config = state['scenario']
+    if state['depleted_year'] is not None:
+        return {'Scenario Name': scenario_config['name'], 'Total Lifetime Taxes': state['total_taxes_paid'], 'Total IRMAA Paid': state['total_irmaa_paid'], 'Final Portfolio Value': 0, 'Present Value': 0, 'CAGR': -1.0, 'Age Portfolio Depleted': 63 + state['year_index'] - 1}
+    final_portfolio_value = state['balance'].sum()
+    projection_years = state['projection_years']; initial_portfolio_value = state['initial_portfolio_value']
+    if projection_years > 0:
+        present_value = final_portfolio_value / ((1 + state['baseline_inf_general']) ** projection_years)
+        cagr = ((final_portfolio_value / initial_portfolio_value) ** (1 / projection_years) - 1) if initial_portfolio_value > 0 else 0.0
+    else:
+        present_value = final_portfolio_value; cagr = 0.0
+    return {'Scenario Name': scenario_config['name'], 'Total Lifetime Taxes': state['total_taxes_paid'], 'Total IRMAA Paid': state['total_irmaa_paid'], 'Final Portfolio Value': final_portfolio_value, 'Present Value': present_value, 'CAGR': cagr, 'Age Portfolio Depleted': 'N/A'}
+
+def print_depletion_banner(scenario_name, depleted_year, age):
+    print(f"\n***********************************************************************")
+    print(f"MONEY DEPLETED in {scenario_name} during {depleted_year} at age {age}.")
+    print(f"***********************************************************************\n")
+
+def finish_scenario(state):
+    summary = summarize_scenario_state(state)
+    if state['depleted_year'] is not None: print_depletion_banner(state['scenario']['name'], state['depleted_year'], summary['Age Portfolio Depleted'])
+    return summary, results_frame(state['results'][:state['year_index']], state['result_schema']['metrics'])
+
+def copy_scenario_state(state):
+    state_copy = dict(state)
+    for key in ['balance', 'expense_amount', 'pension_amount']: state_copy[key] = state[key].copy()
+    state_copy['ss_benefits'] = list(state['ss_benefits']); state_copy['results'] = state['results'].copy()
+    return state_copy
+
+def run_single_scenario(scenario_config, engine=None, inputs=None):
+    if (engine or SIMULATION_ENGINE) == 'dataframe': return run_single_scenario_dataframe(scenario_config, inputs)
+    return finish_scenario(simulate_scenario(scenario_config, inputs))
+
+def simulate_scenario(scenario_config, inputs=None, tax_schedule=None):
+    if inputs is None: inputs = load_inputs()
+    if PROFILER is not None: PROFILER['scenario'] = scenario_config['name']
+    state = init_scenario_state(scenario_config, inputs.config, inputs.model, inputs.social_security, tax_schedule)
+    while state['year_index'] < state['projection_years']:
+        if advance_scenario_year(state): break
+    return state
+
+# --- Parsed Input Snapshot & Cache ---
+# Built once per run (or read from the on-disk cache) and shared read-only by every scenario.
+INPUT_FILE_NAMES = ['config.csv', 'accounts.csv', 'income_streams.csv', 'social_security.csv', 'annual_expenses.csv']
+INPUT_CACHE_VERSION = 1
+InputSnapshot = namedtuple('InputSnapshot', ['config', 'accounts', 'income', 'social_security', 'expenses', 'model', 'content_hash'])
+
+def hash_input_files(input_dir=INPUT_DIR):
+    digest = hashlib.sha256(f"input-cache-v{INPUT_CACHE_VERSION}".encode())
+    for file_name in INPUT_FILE_NAMES:
+        digest.update(file_name.encode())
+        try: digest.update((input_dir / file_name).read_bytes())
+        except FileNotFoundError: digest.update(b'<missing>')
+    return digest.hexdigest()
+
+def build_input_snapshot(input_dir=INPUT_DIR, content_hash=None):
+    with profile_phase('load_data', 'Inputs'): config_df, accounts_df, income_df, ss_df, expenses_df = load_data(input_dir)
+    if 'custom_inflation_rate' not in expenses_df.columns: expenses_df['custom_inflation_rate'] = pd.NA
+    expenses_df['custom_inflation_rate'] = pd.to_numeric(expenses_df['custom_inflation_rate'], errors='coerce')
+    model = build_model_arrays(accounts_df, income_df, expenses_df)
+    return InputSnapshot(config_df, accounts_df, income_df, ss_df, expenses_df, model, content_hash or hash_input_files(input_dir))
+
+def load_inputs(input_dir=INPUT_DIR, use_cache=True):
+    content_hash = hash_input_files(input_dir)
+    cache_file = INPUT_CACHE_DIR / f"{content_hash}.pkl"
+    if use_cache and cache_file.exists():
+        try:
+            with open(cache_file, 'rb') as f: return InputSnapshot(*pickle.load(f))
+        except Exception:
+            cache_file.unlink(missing_ok=True)
+    snapshot = build_input_snapshot(input_dir, content_hash)
+    if use_cache:
+        INPUT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        temp_file = INPUT_CACHE_DIR / f"{content_hash}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f: pickle.dump(tuple(snapshot), f, protocol=pickle.HIGHEST_PROTOCOL)
+        temp_file.replace(cache_file)
+    return snapshot
+
+# --- Batched Engine & Monte Carlo Simulation ---
+MONTE_CARLO_DIR = REPORTS_DIR / "monte_carlo"
+MONTE_CARLO_SETTINGS = {
+    'num_paths': 10000, 'seed': 2025,
+    # Means of None fall back to the scenario's baseline assumptions from config.csv.
+    'equity_mean': None, 'equity_volatility': 0.17,
+    'inflation_mean': None, 'inflation_volatility': 0.015,
+    'cash_mean': None, 'cash_volatility': 0.01,
+    # Correlation matrix of (equity return, general inflation, cash rate).
+    'correlation': [[1.0, -0.10, 0.05], [-0.10, 1.0, 0.60], [0.05, 0.60, 1.0]],
+}
+PERCENTILE_BANDS = [5, 25, 50, 75, 95]
+
+def generate_market_paths(num_paths, num_years, means, volatilities, correlation, seed):
+    rng = np.random.default_rng(seed)
+    cholesky = np.linalg.cholesky(np.asarray(correlation, dtype=float))
+    draws = rng.standard_normal((num_paths, num_years, 3)) @ cholesky.T
+    draws = np.asarray(means, dtype=float) + draws * np.asarray(volatilities, dtype=float)
+    return {'equity_return': draws[..., 0], 'inflation_general': draws[..., 1], 'cash_return': draws[..., 2]}
+
+def scenario_baseline_rates(scenario_config, config_df):
+    return {
+        'equity_return': float(config_df['baseline_equity_return']), 'cash_return': float(config_df['baseline_cash_return']),
+        'inflation_general': float(scenario_config.get('inflation_rate_general', config_df['inflation_rate_general'])),
+        'inflation_healthcare': float(scenario_config.get('inflation_rate_healthcare', config_df['inflation_rate_healthcare'])),
+    }
+
+def build_monte_carlo_paths(scenario_config, config_df, settings=None):
+    settings = {**MONTE_CARLO_SETTINGS, **(settings or {})}
+    baseline = scenario_baseline_rates(scenario_config, config_df)
+    means = [baseline['equity_return'] if settings['equity_mean'] is None else settings['equity_mean'],
+             baseline['inflation_general'] if settings['inflation_mean'] is None else settings['inflation_mean'],
+             baseline['cash_return'] if settings['cash_mean'] is None else settings['cash_mean']]
+    volatilities = [settings['equity_volatility'], settings['inflation_volatility'], settings['cash_volatility']]
+    market_paths = generate_market_paths(int(settings['num_paths']), int(config_df['projection_years']), means, volatilities, settings['correlation'], settings['seed'])
+    # Healthcare inflation keeps the scenario's spread over general inflation.
+    market_paths['inflation_healthcare'] = market_paths['inflation_general'] + (baseline['inflation_healthcare'] - baseline['inflation_general'])
+    historical_data = scenario_config.get('historical_data')
+    if historical_data:
+        for i, (stock_return, inflation, cash_return) in enumerate(list(historical_data.values())[:int(config_df['projection_years'])]):
+            market_paths['equity_return'][:, i] = stock_return; market_paths['cash_return'][:, i] = cash_return
+            market_paths['inflation_general'][:, i] = inflation; market_paths['inflation_healthcare'][:, i] = inflation
+    return market_paths
+
+def deterministic_market_paths(scenario_config, config_df, num_paths=1):
+    projection_years = int(config_df['projection_years'])
+    baseline = scenario_baseline_rates(scenario_config, config_df)
+    market_paths = {key: np.full((num_paths, projection_years), value) for key, value in baseline.items()}
+    historical_data = scenario_config.get('historical_data')
+    if historical_data:
+        for i, (stock_return, inflation, cash_return) in enumerate(list(historical_data.values())[:projection_years]):
+            market_paths['equity_return'][:, i] = stock_return; market_paths['cash_return'][:, i] = cash_return
+            market_paths['inflation_general'][:, i] = inflation; market_paths['inflation_healthcare'][:, i] = inflation
+    return market_paths
+
+def withdraw_from_group_batched(balance, index, amount):
+    group_balance = balance[:, index]
+    total = group_balance.sum(axis=1)
+    withdrawal_amount = np.minimum(amount, total)
+    share = np.divide(withdrawal_amount, total, out=np.zeros_like(total), where=total > 0)
+    balance[:, index] = group_balance - share[:, None] * group_balance
+    return withdrawal_amount
+
+def run_batched_paths(scenario_config, config_df, model, ss_df, market_paths, tax_schedule=None, max_years=None, max_depleted=None, path_overrides=None):
+    # A precompiled tax_schedule (for these paths' inflation) can be passed in when the same paths are run repeatedly.
+    # max_years, or more than max_depleted paths running out, stops the projection early; the final and present values are then not meaningful.
+    # path_overrides gives each path its own inputs: 'balance', 'custom_annual_rate', 'expense_amount', 'pension_amount' or 'fra_benefit'
+    # as one row per path, and 'discount_inflation' as one rate per path for the present value.
+    overrides = path_overrides or {}
+    start_year = int(config_df['start_year']); projection_years = int(config_df['projection_years']); filing_status = config_df['federal_filing_status']
+    num_paths = market_paths['equity_return'].shape[0]; type_index = model['type_index']; liquid_index = model['liquid_index']
+    ss_data = ss_df.set_index('person_name').to_dict('index')
+    person_names = list(ss_data.keys())[:2]; ss_ages = [scenario_config[f"{name}_ss_age"] for name in person_names]
+    fra_benefits = np.asarray(overrides['fra_benefit'] if 'fra_benefit' in overrides else np.tile([ss_data[name]['fra_benefit'] for name in person_names], (num_paths, 1)), dtype=float)
+    ss_benefits = np.column_stack([calculate_ss_benefit(fra_benefits[:, p], ss_data[name]['fra_age'], age) for p, (name, age) in enumerate(zip(person_names, ss_ages))])
+    if tax_schedule is None: tax_schedule = compile_tax_schedule(market_paths['inflation_general'], filing_status)
+    tax_mode = scenario_config.get('tax_mode', TAX_MODE)
+    irmaa_thresholds = np.array([bracket['threshold'] for bracket in MEDICARE_IRMAA_BRACKETS], dtype=float)
+    irmaa_amounts = np.array([(bracket['part_b_surcharge'] + bracket['part_d_surcharge']) * 2 * 12 for bracket in MEDICARE_IRMAA_BRACKETS])
+    roth_strategy = scenario_config.get('roth_strategy'); roth_end_year = scenario_config.get('roth_end_year', 0)
+
+    balance, expense_amount, pension_amount = [np.array(overrides[key], dtype=float) if key in overrides else np.tile(model[key], (num_paths, 1)) for key in ['balance', 'expense_amount', 'pension_amount']]
+    custom_annual_rate = overrides.get('custom_annual_rate', model['custom_annual_rate'])
+    initial_portfolio_value = balance.sum(axis=1) if 'balance' in overrides else model['balance'].sum()
+    magi_history = np.zeros((num_paths, projection_years)); savings = np.zeros((num_paths, projection_years))
+    total_taxes = np.zeros(num_paths); total_irmaa = np.zeros(num_paths)
+    depleted_index = np.full(num_paths, -1); alive = np.ones(num_paths, dtype=bool); years_simulated = 0
+
+    for i in range(projection_years if max_years is None else min(max_years, projection_years)):
+        current_year = start_year + i; current_age = 63 + i; years_simulated = i + 1
+        stock_return = market_paths['equity_return'][:, i]; cash_return = market_paths['cash_return'][:, i]
+        inf_general = market_paths['inflation_general'][:, i]; inf_health = market_paths['inflation_healthcare'][:, i]
+
+        expense_rates = np.where(model['expense_has_custom_rate'], model['expense_custom_rate'], np.where(model['expense_is_healthcare'], inf_health[:, None], inf_general[:, None]))
+        inflating = current_year > model['expense_start']
+        expense_amount[:, inflating] *= 1 + expense_rates[:, inflating]
+        for p, age in enumerate(ss_ages):
+            if current_age > age: ss_benefits[:, p] *= 1 + inf_general
+        pension_indexed = model['pension_indexed'] & (current_year > model['pension_start'])
+        pension_amount[:, pension_indexed] *= 1 + inf_general[:, None]
+
+        irmaa_surcharge = np.zeros(num_paths)
+        if current_year >= 2027 and i >= 2:
+            above = magi_history[:, i-2][:, None] > irmaa_thresholds
+            irmaa_surcharge = np.where(above.any(axis=1), irmaa_amounts[above.argmax(axis=1)], 0)
+        total_irmaa += np.where(alive, irmaa_surcharge, 0)
+
+        prior_trad_bal = balance[:, type_index['traditional']].sum(axis=1)
+        pension_active = (model['pension_start'] <= current_year) & (model['pension_end'] >= current_year)
+        pension_income = pension_amount[:, pension_active].sum(axis=1)
+        roth_conversion_amount = np.zeros(num_paths)
+        if current_year <= roth_end_year:
+            if roth_strategy in ('fixed_amount', 'till_2028'):
+                roth_conversion_amount = np.full(num_paths, float(scenario_config.get('roth_amount', 0)))
+            elif roth_strategy == 'fill_bracket':
+                roth_conversion_amount = schedule_bracket_room(tax_schedule, i, scenario_config.get('roth_target_bracket_rate', 0), pension_income) * np.ones(num_paths)
+        roth_conversion_amount = np.where(roth_conversion_amount > 0, np.maximum(0, np.minimum(roth_conversion_amount, prior_trad_bal)), 0)
+        if roth_conversion_amount.any():
+            withdraw_from_group_batched(balance, type_index['traditional'], roth_conversion_amount)
+            balance[:, type_index['roth']] += roth_conversion_amount[:, None]
+
+        growth_rates = np.where(model['is_equity'], stock_return[:, None], np.where(model['is_cash_asset'], cash_return[:, None], custom_annual_rate))
+        income_on_accounts = (balance[:, liquid_index] * growth_rates[:, liquid_index]).sum(axis=1)
+        balance *= 1 + growth_rates
+
+        ss_income = sum(np.where(current_age >= age, ss_benefits[:, p], 0) for p, age in enumerate(ss_ages))
+        rmd_amount = prior_trad_bal / IRS_UNIFORM_LIFETIME_TABLE.get(current_age, 8.9) if current_age >= 75 else np.zeros(num_paths)
+
+        expense_active = (model['expense_start'] <= current_year) & (model['expense_end'] >= current_year)
+        year_expenses = expense_amount[:, expense_active].sum(axis=1) + irmaa_surcharge
+        cash_needed_for_spending = np.maximum(0, year_expenses - (pension_income + ss_income))
+        non_retirement_cash = balance[:, liquid_index].sum(axis=1)
+        if tax_mode == 'gross_up':
+            traditional_available = balance[:, type_index['traditional']].sum(axis=1); ss_share = np.zeros(num_paths)
+            for _ in range(3):
+                base_taxable_income = pension_income + roth_conversion_amount + income_on_accounts + ss_income * ss_share
+                shortfall = np.maximum(0, cash_needed_for_spending + schedule_federal_tax(tax_schedule, i, base_taxable_income) - non_retirement_cash)
+                traditional_withdrawal = np.maximum(rmd_amount, np.minimum(schedule_gross_up(tax_schedule, i, base_taxable_income, shortfall), traditional_available))
+                new_share = ss_taxable_share(tax_schedule, i, pension_income + roth_conversion_amount + traditional_withdrawal + income_on_accounts + ss_income)
+                if np.array_equal(new_share, ss_share): break
+                ss_share = new_share
+        else:
+            traditional_withdrawal = np.where(cash_needed_for_spending > 0, np.maximum(0, cash_needed_for_spending - non_retirement_cash), 0)
+            traditional_withdrawal = np.maximum(rmd_amount, traditional_withdrawal)
+
+        AGI_Proxy = pension_income + roth_conversion_amount + traditional_withdrawal + income_on_accounts
+        MAGI = AGI_Proxy + ss_income
+        federal_tax = schedule_federal_tax(tax_schedule, i, AGI_Proxy + ss_income * ss_taxable_share(tax_schedule, i, MAGI))
+        total_taxes += np.where(alive, federal_tax, 0)
+        cash_needed_from_portfolio = cash_needed_for_spending + federal_tax
+
+        withdrawn_so_far = np.zeros(num_paths)
+        for acc_type in ['cash', 'brokerage', 'traditional', 'roth']:
+            withdrawn_so_far += withdraw_from_group_batched(balance, type_index[acc_type], np.maximum(0, cash_needed_from_portfolio - withdrawn_so_far))
+
+        magi_history[:, i] = np.round(MAGI)
+        savings[:, i] = np.where(alive, balance.sum(axis=1), 0)
+        newly_depleted = alive & (withdrawn_so_far < cash_needed_from_portfolio - 1)
+        depleted_index[newly_depleted] = i; alive &= ~newly_depleted
+        if not alive.any() or (max_depleted is not None and num_paths - alive.sum() > max_depleted): break
+
+    final_value = np.where(alive, balance.sum(axis=1), 0)
+    baseline_inf_general = overrides.get('discount_inflation', scenario_baseline_rates(scenario_config, config_df)['inflation_general'])
+    present_value = final_value / ((1 + baseline_inf_general) ** projection_years) if projection_years > 0 else final_value
+    return {'savings': savings, 'depleted_index': depleted_index, 'total_taxes': total_taxes, 'total_irmaa': total_irmaa,
+            'final_value': final_value, 'present_value': present_value, 'initial_portfolio_value': initial_portfolio_value,
+            'start_year': start_year, 'projection_years': projection_years, 'years_simulated': years_simulated}
+
+def summarize_batched_paths(scenario_name, results):
+    depleted = results['depleted_index'] >= 0
+    depletion_ages = 63 + results['depleted_index'][depleted]
+    summary = {
+        'Scenario Name': scenario_name, 'Paths': len(depleted), 'Success Rate': 1 - depleted.mean(),
+        'Median Depletion Age': np.median(depletion_ages) if depleted.any() else 'N/A',
+        'Earliest Depletion Age': depletion_ages.min() if depleted.any() else 'N/A',
+        'Median Final Value': np.median(results['final_value']), 'Median Present Value': np.median(results['present_value']),
+        'Median Lifetime Taxes': np.median(results['total_taxes']), 'Median IRMAA Paid': np.median(results['total_irmaa']),
+    }
+    bands = pd.DataFrame(np.percentile(results['savings'], PERCENTILE_BANDS, axis=0).T.round(), columns=[f'P{p} Total Savings' for p in PERCENTILE_BANDS])
+    bands.insert(0, 'Year', results['start_year'] + np.arange(results['projection_years']))
+    ages, counts = np.unique(depletion_ages, return_counts=True)
+    depletion_df = pd.DataFrame({'Age Portfolio Depleted': ages, 'Paths': counts, 'Share of Paths': counts / len(depleted)})
+    return summary, bands, depletion_df
+
+def run_monte_carlo(scenario_config, settings=None, inputs=None):
+    if inputs is None: inputs = load_inputs()
+    market_paths = build_monte_carlo_paths(scenario_config, inputs.config, settings)
+    results = run_batched_paths(scenario_config, inputs.config, inputs.model, inputs.social_security, market_paths)
+    return summarize_batched_paths(scenario_config['name'], results)
+
+# --- Rolling-Window Historical Backtest ---
+# Every year of a long market history becomes a starting year. All windows for a scenario run as one batch through run_batched_paths.
+BACKTEST_DIR = REPORTS_DIR / "backtest"
+BACKTEST_SETTINGS = {
+    # CSV with one row per calendar year: year, equity_return, inflation, cash_return (decimals, e.g. 0.07 for 7%).
+    'history_file': INPUT_DIR / 'market_history.csv',
+    # 'wrap' continues a window from the start of the history; 'truncate' falls back to the config.csv baselines once history runs out.
+    'window_mode': 'wrap',
+}
+
+def load_market_history(history_file):
+    required_columns = ['year', 'equity_return', 'inflation', 'cash_return']
+    try:
+        history_df = pd.read_csv(history_file)
+    except FileNotFoundError:
+        raise InputDataError(f"FATAL ERROR: Market history file '{history_file}' was not found.")
+    history_df.columns = history_df.columns.str.strip().str.lower()
+    missing_columns = [col for col in required_columns if col not in history_df.columns]
+    if missing_columns:
+        raise InputDataError(f"FATAL ERROR: Market history file '{history_file}' is missing column(s): {missing_columns}. Expected: {required_columns}")
+    history_df = history_df[required_columns].apply(pd.to_numeric, errors='coerce')
+    if history_df.empty:
+        raise InputDataError(f"FATAL ERROR: Market history file '{history_file}' has no rows.")
+    # Line numbers count the header as line 1, as a spreadsheet shows them.
+    bad_lines = (history_df.index[history_df.isna().any(axis=1) | (history_df['year'] % 1 != 0)] + 2).tolist()
+    if bad_lines:
+        raise InputDataError(f"FATAL ERROR: Market history file '{history_file}' has missing or non-numeric values on line(s) {bad_lines}. Every row needs a whole-number year and three numeric rates.")
+    history_df['year'] = history_df['year'].astype(int)
+    duplicate_years = sorted(history_df.loc[history_df['year'].duplicated(), 'year'].unique().tolist())
+    if duplicate_years:
+        raise InputDataError(f"FATAL ERROR: Market history file '{history_file}' lists year(s) {duplicate_years} more than once.")
+    history_df = history_df.sort_values('year').reset_index(drop=True)
+    gaps = [(int(before), int(after)) for before, after in zip(history_df['year'][:-1], history_df['year'][1:]) if after != before + 1]
+    if gaps:
+        raise InputDataError(f"FATAL ERROR: Market history file '{history_file}' skips years between {', '.join(f'{before} and {after}' for before, after in gaps)}. Rolling windows need one row for every year.")
+    return history_df
+
+def build_backtest_paths(history_df, scenario_config, config_df, window_mode='wrap'):
+    projection_years = int(config_df['projection_years']); num_windows = len(history_df)
+    offsets = np.arange(num_windows)[:, None] + np.arange(projection_years)[None, :]
+    if window_mode == 'wrap':
+        history_index = offsets % num_windows; in_history = np.ones(offsets.shape, dtype=bool)
+    elif window_mode == 'truncate':
+        history_index = np.minimum(offsets, num_windows - 1); in_history = offsets < num_windows
+    else:
+        raise ValueError(f"Unknown backtest window mode '{window_mode}'. Use 'wrap' or 'truncate'.")
+    baseline = scenario_baseline_rates(scenario_config, config_df)
+    history_columns = {'equity_return': 'equity_return', 'cash_return': 'cash_return', 'inflation_general': 'inflation', 'inflation_healthcare': 'inflation'}
+    market_paths = {key: np.where(in_history, history_df[col].to_numpy(dtype=float)[history_index], baseline[key]) for key, col in history_columns.items()}
+    return market_paths, history_df['year'].to_numpy(dtype=int)
+
+def run_backtest(scenario_config, history_df, window_mode='wrap', inputs=None):
+    if inputs is None: inputs = load_inputs()
+    # The rolling windows replace any fixed historical_data sequence attached to the scenario.
+    scenario_config = {key: value for key, value in scenario_config.items() if key != 'historical_data'}
+    market_paths, start_years = build_backtest_paths(history_df, scenario_config, inputs.config, window_mode)
+    results = run_batched_paths(scenario_config, inputs.config, inputs.model, inputs.social_security, market_paths)
+    depleted = results['depleted_index'] >= 0
+    windows_df = pd.DataFrame({
+        'History Start Year': start_years,
+        'Age Portfolio Depleted': np.where(depleted, 63 + results['depleted_index'], -1),
+        'Final Portfolio Value': results['final_value'].round().astype(np.int64), 'Present Value': results['present_value'].round().astype(np.int64),
+        'Total Lifetime Taxes': results['total_taxes'].round().astype(np.int64), 'Total IRMAA Paid': results['total_irmaa'].round().astype(np.int64),
+    })
+    # Worst case: the earliest depletion, or the lowest present value if every window survives.
+    worst = np.lexsort((results['present_value'], np.where(depleted, results['depleted_index'], np.iinfo(int).max)))[0]
+    depletion_ages = 63 + results['depleted_index'][depleted]
+    summary = {
+        'Scenario Name': scenario_config['name'], 'Windows': len(start_years), 'Failure Rate': depleted.mean(),
+        'Worst Start Year': start_years[worst], 'Worst Case Depletion Age': 63 + results['depleted_index'][worst] if depleted[worst] else 'N/A',
+        'Median Depletion Age': np.median(depletion_ages) if depleted.any() else 'N/A',
+        'Worst Case Present Value': results['present_value'][worst], 'Median Present Value': np.median(results['present_value']),
+    }
+    windows_df['Age Portfolio Depleted'] = windows_df['Age Portfolio Depleted'].astype(object).where(depleted, 'N/A')
+    return summary, windows_df
+
+# --- Max Sustainable Spending Solver ---
+# Bisects a spending multiplier (or a flat yearly add-on) for the most spending that stays funded through the target age.
+# The tax schedule and market paths are built once per scenario. Each trial stops at the first depletion (or at the target age),
+# so failing trials are cheap.
+SPENDING_SOLVER_SETTINGS = {
+    'adjustment': 'multiplier',  # 'multiplier' scales every expense line; 'add_on' adds one general-inflation line, in start-year dollars
+    'target_age': None,          # stay funded through this age (None: the whole projection)
+    'success_rate': 0.9,         # historical and sampled paths: share of paths that must stay funded
+    'tolerance': 100.0,          # stop once first-year spending is pinned down to within this many dollars
+    'max_trials': 60,
+}
+SPENDING_ADD_ON_NAME = 'Spending Add-On'
+
+def first_year_spending(model, start_year):
+    active = (model['expense_start'] <= start_year) & (model['expense_end'] >= start_year)
+    return model['expense_amount'][active].sum()
+
+def adjust_spending(model, start_year, end_year, adjustment, amount):
+    adjusted = dict(model)
+    if adjustment == 'multiplier':
+        adjusted['expense_amount'] = model['expense_amount'] * amount
+    elif adjustment == 'add_on':
+        adjusted['expense_names'] = model['expense_names'] + [SPENDING_ADD_ON_NAME]
+        for key, value in [('expense_amount', amount), ('expense_start', start_year), ('expense_end', end_year), ('expense_custom_rate', np.nan), ('expense_has_custom_rate', False), ('expense_is_healthcare', False)]:
+            adjusted[key] = np.append(model[key], value)
+    else:
+        raise ValueError(f"Unknown spending adjustment '{adjustment}'. Use 'multiplier' or 'add_on'.")
+    return adjusted
+
+def spending_trial_runner(scenario_config, inputs, paths, horizon, settings, history_df=None, window_mode='wrap'):
+    # Returns trial(model) -> (share of paths funded through the horizon, path-years simulated) and the number of paths.
+    config_df = inputs.config; filing_status = config_df['federal_filing_status']
+    if paths == 'deterministic':
+        tax_schedule = compile_tax_schedule(scenario_inflation_path(scenario_config, config_df), filing_status)
+        def trial(model):
+            state = init_scenario_state(scenario_config, config_df, model, inputs.social_security, tax_schedule)
+            while state['year_index'] < horizon:
+                if advance_scenario_year(state): break
+            return float(state['depleted_year'] is None), state['year_index']
+        return trial, 1
+    if paths == 'historical':
+        scenario_config = {key: value for key, value in scenario_config.items() if key != 'historical_data'}
+        market_paths, _ = build_backtest_paths(history_df, scenario_config, config_df, window_mode)
+    elif paths == 'sampled':
+        market_paths = build_monte_carlo_paths(scenario_config, config_df, settings.get('monte_carlo'))
+    else:
+        raise ValueError(f"Unknown path type '{paths}'. Use 'deterministic', 'historical' or 'sampled'.")
+    tax_schedule = compile_tax_schedule(market_paths['inflation_general'], filing_status)
+    num_paths = market_paths['equity_return'].shape[0]
+    # Once more paths have failed than the success rate allows, the trial's outcome is settled and it stops there.
+    max_depleted = int(np.floor(num_paths * (1 - settings['success_rate']) + 1e-9))
+    def trial(model):
+        results = run_batched_paths(scenario_config, config_df, model, inputs.social_security, market_paths, tax_schedule, max_years=horizon, max_depleted=max_depleted)
+        return (results['depleted_index'] < 0).mean(), results['years_simulated'] * num_paths
+    return trial, num_paths
+
+def spending_horizon(target_age, projection_years):
+    # Years the money must last: the first projection year is age 63, the last is age 62 + projection_years.
+    if target_age is None: return projection_years
+    if not 63 <= target_age <= 62 + projection_years:
+        raise ValueError(f"Target age {target_age} is outside the projection, which covers ages 63 to {62 + projection_years}.")
+    return target_age - 62
+
+def solve_max_spending(scenario_config, inputs=None, paths='deterministic', settings=None, history_df=None, window_mode='wrap'):
+    if inputs is None: inputs = load_inputs()
+    settings = {**SPENDING_SOLVER_SETTINGS, **(settings or {})}
+    adjustment = settings['adjustment']
+    start_year = int(inputs.config['start_year']); projection_years = int(inputs.config['projection_years'])
+    horizon = spending_horizon(settings['target_age'], projection_years)
+    trial, num_paths = spending_trial_runner(scenario_config, inputs, paths, horizon, settings, history_df, window_mode)
+    if PROFILER is not None: PROFILER['scenario'] = f"Solver trials: {scenario_config['name']}"
+    required_rate = 1.0 if paths == 'deterministic' else settings['success_rate']
+    base_spending = first_year_spending(inputs.model, start_year)
+    dollars_per_unit = base_spending if adjustment == 'multiplier' else 1.0
+    trials = 0; path_years = 0; rates = {}
+
+    def funded(amount):
+        nonlocal trials, path_years
+        rate, years = trial(adjust_spending(inputs.model, start_year, start_year + projection_years, adjustment, amount))
+        trials += 1; path_years += years; rates[amount] = rate
+        return rate >= required_rate
+
+    # The bracket starts at today's plan: if it is funded, double upward until a trial fails; otherwise search down towards no spending.
+    current = 1.0 if adjustment == 'multiplier' else 0.0
+    floor = 0.0 if adjustment == 'multiplier' else -base_spending
+    if funded(current):
+        low, high = current, (2.0 if adjustment == 'multiplier' else max(base_spending, 10000.0))
+        while trials < settings['max_trials'] and funded(high): low, high = high, high * 2
+    else:
+        low, high = floor, current
+    while trials < settings['max_trials'] and (high - low) * dollars_per_unit > settings['tolerance']:
+        mid = (low + high) / 2
+        if funded(mid): low = mid
+        else: high = mid
+    solved = funded(low) if low not in rates else rates[low] >= required_rate
+    max_spending = (base_spending * low if adjustment == 'multiplier' else base_spending + low) if solved else np.nan
+    return {
+        'Scenario Name': scenario_config['name'], 'Paths': paths, 'Adjustment': adjustment,
+        'Funded Through Age': 63 + horizon - 1, 'Required Success Rate': required_rate,
+        'Max Multiplier' if adjustment == 'multiplier' else 'Max Add-On': low if solved else np.nan,
+        'Current First-Year Spending': base_spending, 'Max First-Year Spending': max_spending,
+        'Success Rate at Max': rates[low], 'Trials': trials,
+        'Full-Run Equivalents': path_years / (num_paths * projection_years) if projection_years else 0.0,
+    }
+
+# --- Sensitivity Analysis (Tornado) ---
+# Each numeric input is nudged down and up while everything else stays at the scenario's values. The unperturbed scenario and
+# every variant run as paths of one run_batched_paths call, so a hundred inputs cost about as much as a few single runs.
+SENSITIVITY_DIR = REPORTS_DIR / "sensitivity"
+SENSITIVITY_SETTINGS = {
+    'rate_step': 0.01,     # returns and inflation rates move this much up and down (absolute)
+    'amount_step': 0.10,   # balances, expenses, pensions and SS benefits move this share up and down
+    'rank_by': 'Present Value',
+    'chart_parameters': 20,
+}
+SENSITIVITY_OUTCOMES = ['Present Value', 'Total Lifetime Taxes', 'Depletion Age']
+
+def sensitivity_parameters(scenario_config, inputs, settings=None):
+    # One entry per input that can move the outcome; zero amounts and market-linked account rates are left out.
+    settings = {**SENSITIVITY_SETTINGS, **(settings or {})}
+    rate_step = settings['rate_step']; amount_step = settings['amount_step']; model = inputs.model
+    baseline = scenario_baseline_rates(scenario_config, inputs.config)
+    parameters = []
+
+    def add(label, kind, key, position, base_value, step, relative):
+        low, high = (base_value * (1 - step), base_value * (1 + step)) if relative else (base_value - step, base_value + step)
+        parameters.append({'Parameter': label, 'kind': kind, 'key': key, 'position': position, 'Base Value': base_value, 'Low Value': low, 'High Value': high})
+
+    add('Equity Return', 'config', 'baseline_equity_return', None, baseline['equity_return'], rate_step, False)
+    add('Cash Return', 'config', 'baseline_cash_return', None, baseline['cash_return'], rate_step, False)
+    add('General Inflation', 'scenario', 'inflation_rate_general', None, baseline['inflation_general'], rate_step, False)
+    add('Healthcare Inflation', 'scenario', 'inflation_rate_healthcare', None, baseline['inflation_healthcare'], rate_step, False)
+    custom_rate_accounts = ~model['is_equity'] & ~model['is_cash_asset']
+    for n, account_name in enumerate(inputs.accounts['account_name']):
+        if model['balance'][n] != 0: add(f'Balance: {account_name}', 'path', 'balance', n, model['balance'][n], amount_step, True)
+        if custom_rate_accounts[n] and not np.isnan(model['custom_annual_rate'][n]):
+            add(f'Return: {account_name}', 'path', 'custom_annual_rate', n, model['custom_annual_rate'][n], rate_step, False)
+    for n, expense_name in enumerate(model['expense_names']):
+        if model['expense_amount'][n] != 0: add(f'Expense: {expense_name}', 'path', 'expense_amount', n, model['expense_amount'][n], amount_step, True)
+    for n, stream_name in enumerate(inputs.income['stream_name']):
+        if model['pension_amount'][n] != 0: add(f'Income: {stream_name}', 'path', 'pension_amount', n, model['pension_amount'][n], amount_step, True)
+    for n, row in enumerate(inputs.social_security.head(2).itertuples(index=False)):
+        add(f'SS Benefit at FRA: {row.person_name}', 'path', 'fra_benefit', n, float(row.fra_benefit), amount_step, True)
+    return parameters
+
+def build_sensitivity_batch(scenario_config, inputs, parameters):
+    # Path 0 is the scenario as given; parameter n's low and high variants are paths 2n+1 and 2n+2.
+    config_df = inputs.config; model = inputs.model
+    variants = [(None, None)] + [(parameter, value) for parameter in parameters for value in (parameter['Low Value'], parameter['High Value'])]
+    num_paths = len(variants)
+    path_overrides = {key: np.tile(model[key], (num_paths, 1)) for key in ['balance', 'custom_annual_rate', 'expense_amount', 'pension_amount']}
+    path_overrides['fra_benefit'] = np.tile(inputs.social_security['fra_benefit'].head(2).to_numpy(dtype=float), (num_paths, 1))
+    path_overrides['discount_inflation'] = np.full(num_paths, scenario_baseline_rates(scenario_config, config_df)['inflation_general'])
+    market_paths = deterministic_market_paths(scenario_config, config_df, num_paths)
+    # Each row's tax brackets are indexed the way the yearly engine indexes that variant's own inflation path.
+    tax_inflation = np.tile(scenario_inflation_path(scenario_config, config_df), (num_paths, 1))
+    for path, (parameter, value) in enumerate(variants):
+        if parameter is None: continue
+        if parameter['kind'] == 'path':
+            path_overrides[parameter['key']][path, parameter['position']] = value
+            continue
+        # Only the few market-rate variants need their own market path.
+        variant_scenario, variant_config = scenario_config, config_df
+        if parameter['kind'] == 'scenario': variant_scenario = {**scenario_config, parameter['key']: value}
+        else: variant_config = config_df.copy(); variant_config[parameter['key']] = value
+        for key, values in deterministic_market_paths(variant_scenario, variant_config).items(): market_paths[key][path] = values[0]
+        path_overrides['discount_inflation'][path] = scenario_baseline_rates(variant_scenario, variant_config)['inflation_general']
+        tax_inflation[path] = scenario_inflation_path(variant_scenario, variant_config)
+    tax_schedule = compile_tax_schedule(tax_inflation, config_df['federal_filing_status'], price_level='year_rate')
+    return market_paths, path_overrides, tax_schedule
+
+def run_sensitivity(scenario_config, inputs=None, settings=None):
+    if inputs is None: inputs = load_inputs()
+    settings = {**SENSITIVITY_SETTINGS, **(settings or {})}
+    parameters = sensitivity_parameters(scenario_config, inputs, settings)
+    market_paths, path_overrides, tax_schedule = build_sensitivity_batch(scenario_config, inputs, parameters)
+    results = run_batched_paths(scenario_config, inputs.config, inputs.model, inputs.social_security, market_paths, tax_schedule, path_overrides=path_overrides)
+    # A path that never runs out counts as lasting to the end of the projection, so its depletion age change is measured from there.
+    depleted = results['depleted_index'] >= 0
+    outcomes = {'Present Value': results['present_value'], 'Total Lifetime Taxes': results['total_taxes'],
+                'Depletion Age': np.where(depleted, 63 + results['depleted_index'], 63 + results['projection_years']).astype(float)}
+    base = {outcome: values[0] for outcome, values in outcomes.items()}
+    rows = []
+    for n, parameter in enumerate(parameters):
+        row = {key: parameter[key] for key in ['Parameter', 'Base Value', 'Low Value', 'High Value']}
+        for outcome, values in outcomes.items():
+            low_change, high_change = values[2*n + 1] - base[outcome], values[2*n + 2] - base[outcome]
+            row.update({f'{outcome}: Low': low_change, f'{outcome}: High': high_change, f'{outcome} Swing': abs(high_change - low_change)})
+        rows.append(row)
+    tornado_df = pd.DataFrame(rows, columns=['Parameter', 'Base Value', 'Low Value', 'High Value'] + [f'{outcome}{suffix}' for outcome in SENSITIVITY_OUTCOMES for suffix in [': Low', ': High', ' Swing']])
+    # Ties (e.g. a present value of zero whichever way an input moves) are broken by depletion age, then by taxes.
+    rank_columns = [f"{outcome} Swing" for outcome in dict.fromkeys([settings['rank_by'], 'Depletion Age', 'Total Lifetime Taxes', 'Present Value'])]
+    tornado_df = tornado_df.sort_values(rank_columns, ascending=False, kind='stable').reset_index(drop=True)
+    base['Depletion Age'] = int(base['Depletion Age']) if depleted[0] else 'N/A'
+    return {'Scenario Name': scenario_config['name'], 'Parameters': len(parameters), **{f'Base {outcome}': value for outcome, value in base.items()}}, tornado_df
+
+def plot_tornado(tornado_df, scenario_name, outcome, base_value, output_dir, max_parameters=SENSITIVITY_SETTINGS['chart_parameters']):
+    # Horizontal bars of each input's low and high effect on one outcome, largest swing on top.
+    from matplotlib.ticker import FuncFormatter
+    fig, ax = reusable_axes('tornado')
+    shown = tornado_df.sort_values(f'{outcome} Swing', ascending=False, kind='stable').head(max_parameters).iloc[::-1]
+    positions = np.arange(len(shown))
+    ax.barh(positions, shown[f'{outcome}: Low'], color='#4c72b0', label='Input lowered')
+    ax.barh(positions, shown[f'{outcome}: High'], color='#dd8452', label='Input raised')
+    ax.axvline(0, color='black', linewidth=0.8)
+    ax.set_yticks(positions, shown['Parameter'])
+    money = outcome != 'Depletion Age'
+    ax.xaxis.set_major_formatter(FuncFormatter((lambda x, p: f'${x:,.0f}') if money else (lambda x, p: f'{x:+.0f}')))
+    base_label = f'${base_value:,.0f}' if money else (f'age {base_value:.0f}' if base_value != 'N/A' else 'not depleted')
+    ax.set_title(f'Sensitivity of {outcome}: {scenario_name}\n(base {base_label})', fontsize=16)
+    ax.set_xlabel(f'Change in {outcome}' + (' ($)' if money else ' (years)'), fontsize=12)
+    ax.legend(fontsize=12, loc='lower right')
+    ax.grid(True, axis='x', linestyle='--', linewidth=0.5)
+    fig.tight_layout()
+    fig.savefig(output_dir / f'{safe_filename(scenario_name)}_tornado_{safe_filename(outcome).replace(" ", "_").lower()}.png')
+
+# --- Columnar Result Store ---
+# Every scenario's yearly detail sits in one (scenario x year x metric) float64 block behind a JSON header, so any slice
+# can be memory-mapped without reading the rest. Workers write their own scenario's rows straight into the file.
+RESULT_STORE_FILE = REPORTS_DIR / "yearly_results.store"
+RESULT_STORE_MAGIC = b'RPSTORE1'
+RESULT_STORE_VERSION = 1
+RESULT_STORE_ALIGNMENT = 64
+
+def result_store_metrics(inputs):
+    return build_result_schema(list(inputs.social_security.set_index('person_name').to_dict('index'))[:2], inputs.model['expense_names'])['metrics']
+
+def create_result_store(path, scenario_names, metrics, start_year, projection_years):
+    header = {'version': RESULT_STORE_VERSION, 'dtype': '<f8', 'shape': [len(scenario_names), projection_years, len(metrics)],
+              'scenarios': list(scenario_names), 'metrics': list(metrics), 'years': list(range(start_year, start_year + projection_years))}
+    header_bytes = json.dumps(header).encode()
+    prefix_length = len(RESULT_STORE_MAGIC) + 8
+    header_bytes = header_bytes.ljust(-(-(prefix_length + len(header_bytes)) // RESULT_STORE_ALIGNMENT) * RESULT_STORE_ALIGNMENT - prefix_length)
+    with open(path, 'wb') as f:
+        f.write(RESULT_STORE_MAGIC + len(header_bytes).to_bytes(8, 'little') + header_bytes)
+    store = open_result_store(path, mode='r+')
+    store['data'][:] = np.nan  # rows left unwritten (years after a depletion) read back as missing
+    store['data'].flush()
+    return store
+
+def open_result_store(path, mode='r'):
+    with open(path, 'rb') as f:
+        if f.read(len(RESULT_STORE_MAGIC)) != RESULT_STORE_MAGIC: raise ValueError(f"'{path}' is not a result store.")
+        header_length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(header_length))
+    if header['version'] != RESULT_STORE_VERSION: raise ValueError(f"'{path}' was written by result store version {header['version']}, expected {RESULT_STORE_VERSION}.")
+    offset = len(RESULT_STORE_MAGIC) + 8 + header_length
+    return {'path': pathlib.Path(path), 'header': header, 'data': np.memmap(path, dtype=header['dtype'], mode=mode, offset=offset, shape=tuple(header['shape']))}
+
+def write_store_results(path, scenario_index, results):
+    data = open_result_store(path, mode='r+')['data']
+    data[scenario_index, :len(results)] = results
+    data.flush()
+
+def store_position(names, key):
+    return int(key) if isinstance(key, (int, np.integer)) else names.index(key)
+
+def load_store_scenario(store, scenario):
+    # One scenario's yearly detail (by name or position), shaped like the per-scenario yearly CSV.
+    rows = store['data'][store_position(store['header']['scenarios'], scenario)]
+    return results_frame(rows[~np.isnan(rows[:, 0])], store['header']['metrics'])
+
+def load_store_metric(store, metric):
+    # One metric for every scenario: a year x scenario table, NaN after a scenario's money ran out.
+    header = store['header']
+    values = store['data'][:, :, store_position(header['metrics'], metric)]
+    return pd.DataFrame(values.T, index=pd.Index(header['years'], name='Year'), columns=header['scenarios'])
+
+def load_store_year(store, year):
+    # Every metric for every scenario in one calendar year: a scenario x metric table.
+    header = store['header']
+    values = store['data'][:, header['years'].index(year), :]
+    return pd.DataFrame(values, index=pd.Index(header['scenarios'], name='Scenario Name'), columns=header['metrics'])
+
+def export_store_csvs(store, output_dir):
+    for n, scenario_name in enumerate(store['header']['scenarios']):
+        with profile_phase('write_csv', scenario_name): load_store_scenario(store, n).to_csv(output_dir / f"{safe_filename(scenario_name)}_yearly.csv", index=False)
+
+# --- Scenario Result Cache ---
+# A scenario's summary and yearly rows are kept under a hash of its config, the input snapshot and MODEL_VERSION.
+# Bump MODEL_VERSION with any change that alters simulation results, so older entries are never reused.
+MODEL_VERSION = 2
+RESULT_CACHE_DIR = CACHE_DIR / "results"
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+def scenario_cache_key(scenario_config, inputs):
+    key_data = {'model_version': MODEL_VERSION, 'engine': SIMULATION_ENGINE, 'tax_mode': TAX_MODE, 'inputs': inputs.content_hash, 'scenario': scenario_config}
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True, default=str).encode()).hexdigest()
+
+def load_cached_result(cache_key, cache_dir=RESULT_CACHE_DIR):
+    cache_file = cache_dir / f"{cache_key}.pkl"
+    if not cache_file.exists(): return None
+    try:
+        with open(cache_file, 'rb') as f: cached = pickle.load(f)
+    except Exception:
+        cache_file.unlink(missing_ok=True)
+        return None
+    os.utime(cache_file)  # eviction removes the least recently used entries first
+    return cached['summary'], cached['results'], cached['depleted_year']
+
+def save_cached_result(cache_key, summary_result, results, depleted_year=None, cache_dir=RESULT_CACHE_DIR):
+    # depleted_year (None if the money lasts) lets a cache hit repeat the depletion banner a fresh run prints.
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    temp_file = cache_dir / f"{cache_key}.{os.getpid()}.tmp"
+    with open(temp_file, 'wb') as f: pickle.dump({'summary': summary_result, 'results': np.asarray(results), 'depleted_year': depleted_year}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    temp_file.replace(cache_dir / f"{cache_key}.pkl")
+
+def evict_result_cache(cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+    if not cache_dir.exists(): return 0
+    entries = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry) for entry in cache_dir.glob('*.pkl')), reverse=True)
+    kept_bytes = 0; evicted = 0
+    for _, size, entry in entries:
+        kept_bytes += size
+        if kept_bytes > max_bytes:
+            entry.unlink(missing_ok=True); evicted += 1
+    return evicted
+
+# --- Scenario Runner (Serial or Process Pool) ---
+WORKER_INPUTS = None
+
+def run_and_store_scenario(scenario_config, inputs, store_path=None, store_index=None, use_cache=False):
+    if SIMULATION_ENGINE == 'dataframe':
+        summary_result, details_df = run_single_scenario_dataframe(scenario_config.copy(), inputs)
+        results = details_df.to_numpy(dtype=float)
+        depleted_year = int(details_df['Year'].iloc[-1]) if summary_result['Age Portfolio Depleted'] != 'N/A' else None
+    else:
+        state = simulate_scenario(scenario_config.copy(), inputs)
+        summary_result, details_df = finish_scenario(state)
+        results = state['results'][:state['year_index']]; depleted_year = state['depleted_year']
+    if store_path is not None: write_store_results(store_path, store_index, results)
+    if use_cache: save_cached_result(scenario_cache_key(scenario_config, inputs), summary_result, results, depleted_year)
+    return summary_result
+
+def init_worker(inputs, profiling=False):
+    global WORKER_INPUTS
+    WORKER_INPUTS = inputs
+    if profiling: enable_profiling()
+
+def run_scenario_chunk(indexed_scenarios, store_path=None, use_cache=False):
+    chunk_results = [(index, run_and_store_scenario(scenario, WORKER_INPUTS, store_path, index, use_cache)) for index, scenario in indexed_scenarios]
+    return chunk_results, (take_profile(PROFILER) if PROFILER is not None else None)
+
+def run_scenarios(scenarios, inputs, workers=1, chunk_size=1, store_path=None, use_cache=False):
+    # Yields (position in `scenarios`, summary, served from cache) as each scenario finishes; callers restore the original order.
+    # With a store_path, each scenario's yearly rows land at that same position in the result store.
+    # With use_cache, scenarios already in the result cache are served from it and only the rest are simulated.
+    pending = []
+    for index, scenario in enumerate(scenarios):
+        cached = load_cached_result(scenario_cache_key(scenario, inputs)) if use_cache else None
+        if cached is None:
+            pending.append((index, scenario))
+            continue
+        summary_result, results, depleted_year = cached
+        if store_path is not None: write_store_results(store_path, index, results)
+        print(f"  - Cached: {scenario['name']}")
+        if depleted_year is not None: print_depletion_banner(scenario['name'], depleted_year, summary_result['Age Portfolio Depleted'])
+        yield index, summary_result, True
+    if min(workers, len(pending)) <= 1:
+        for index, scenario in pending:
+            print(f"  - Simulating: {scenario['name']}")
+            yield index, run_and_store_scenario(scenario, inputs, store_path, index, use_cache), False
+        return
+    chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=init_worker, initargs=(inputs, PROFILER is not None)) as executor:
+        futures = [executor.submit(run_scenario_chunk, chunk, store_path, use_cache) for chunk in chunks]
+        for future in as_completed(futures):
+            chunk_results, chunk_profile = future.result()
+            if chunk_profile is not None: merge_profile(PROFILER, chunk_profile)
+            for index, summary_result in chunk_results:
+                print(f"  - Finished: {scenarios[index]['name']}")
+                yield index, summary_result, False
+
+# --- Reporting Stage (Plots) ---
+# Runs after the simulations, reading yearly detail back from the result store, and can be skipped entirely with --no-plots.
+def plot_stored_scenario(store_path, scenario_index, output_dir):
+    store = open_result_store(store_path)
+    scenario_name = store['header']['scenarios'][scenario_index]
+    details_df = load_store_scenario(store, scenario_index)
+    with profile_phase('plot', scenario_name):
+        plot_financial_overview(details_df, scenario_name, output_dir)
+        plot_savings_breakdown(details_df, scenario_name, output_dir)
+
+def plot_stored_overlay(store_path, metric, output_file):
+    with profile_phase('plot', 'All Scenarios'): plot_scenario_overlay(load_store_metric(open_result_store(store_path), metric), metric, output_file)
+
+def render_plot_jobs(plot_jobs, profiling=False):
+    # In a pool worker, `profiling` starts a local profiler whose measurements go back to the parent with the result.
+    if profiling: enable_profiling()
+    for plot_function, plot_args in plot_jobs: plot_function(*plot_args)
+    return take_profile(PROFILER) if profiling else None
+
+def render_plots(plot_jobs, workers=1):
+    # Jobs are (plot function, args) pairs. Each worker takes an interleaved share, so it keeps redrawing the same few figures.
+    workers = max(1, min(workers, len(plot_jobs)))
+    if workers <= 1:
+        render_plot_jobs(plot_jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(render_plot_jobs, plot_jobs[w::workers], PROFILER is not None) for w in range(workers)]:
+            worker_profile = future.result()
+            if worker_profile is not None: merge_profile(PROFILER, worker_profile)
+
+# --- Parameter Sweep with Shared Prefixes ---
+# Variants that make the same claiming and Roth decisions for their first years share one simulated prefix.
+SWEEP_GRID = {
+    'ss_ages': list(range(62, 71)),
+    'roth_strategy': ['none', 'fixed_amount', 'fill_bracket'],
+    'roth_amount': [25000, 50000, 80000],
+    'roth_end_year': [2028, 2031, 2034],
+    'roth_target_bracket_rate': 0.22,
+}
+ROTH_KEYS = ['roth_strategy', 'roth_amount', 'roth_end_year', 'roth_target_bracket_rate']
+
+def describe_roth_option(roth_option):
+    strategy = roth_option.get('roth_strategy')
+    if strategy == 'fill_bracket': return f"Fill {roth_option['roth_target_bracket_rate']:.0%} thru {roth_option['roth_end_year']}"
+    if strategy in ('fixed_amount', 'till_2028'): return f"Roth ${roth_option['roth_amount']:,.0f} thru {roth_option['roth_end_year']}"
+    return "No Roth"
+
+def build_sweep_variants(base_scenario, person_names, grid=None):
+    grid = {**SWEEP_GRID, **(grid or {})}
+    roth_options = []
+    for strategy in grid['roth_strategy']:
+        if strategy == 'fill_bracket':
+            roth_options += [{'roth_strategy': strategy, 'roth_target_bracket_rate': grid['roth_target_bracket_rate'], 'roth_end_year': end} for end in grid['roth_end_year']]
+        elif strategy in ('fixed_amount', 'till_2028'):
+            roth_options += [{'roth_strategy': strategy, 'roth_amount': amount, 'roth_end_year': end} for amount in grid['roth_amount'] for end in grid['roth_end_year']]
+        else:
+            roth_options.append({'roth_strategy': strategy})
+    base = {key: value for key, value in base_scenario.items() if key not in ROTH_KEYS}
+    variants = []
+    for ages in itertools.product(grid['ss_ages'], repeat=len(person_names)):
+        for roth_option in roth_options:
+            variant = {**base, **roth_option, **{f"{name}_ss_age": age for name, age in zip(person_names, ages)}}
+            variant['name'] = f"{base_scenario['name']} | SS {'/'.join(str(age) for age in ages)} | {describe_roth_option(roth_option)}"
+            variant['base_name'] = base_scenario['name']
+            variants.append(variant)
+    return variants
+
+def sweep_year_key(variant, state):
+    i = state['year_index']; current_year = state['start_year'] + i; current_age = 63 + i
+    claimed = tuple(variant[key] if current_age >= variant[key] else None for key in state['ss_age_keys'])
+    roth = None
+    if current_year <= variant.get('roth_end_year', 0):
+        strategy = variant.get('roth_strategy')
+        if strategy in ('fixed_amount', 'till_2028') and variant.get('roth_amount', 0) > 0: roth = ('fixed', variant['roth_amount'])
+        elif strategy == 'fill_bracket': roth = ('fill', variant.get('roth_target_bracket_rate', 0))
+    return claimed, roth
+
+def enter_sweep_branch(state, variant, ss_data):
+    # A spouse who has not claimed yet still holds the untouched starting benefit, so it can be swapped for this branch's claiming age.
+    state['scenario'] = variant
+    last_age = 63 + state['year_index'] - 1
+    for p, (name, key) in enumerate(zip(state['person_names'], state['ss_age_keys'])):
+        if last_age < variant[key]:
+            state['ss_benefits'][p] = calculate_ss_benefit(ss_data[name]['fra_benefit'], ss_data[name]['fra_age'], variant[key])
+
+def sweep_base_scenario(base_scenario, inputs, grid=None):
+    ss_data = inputs.social_security.set_index('person_name').to_dict('index')
+    person_names = list(ss_data.keys())[:2]
+    variants = build_sweep_variants(base_scenario, person_names, grid)
+    if PROFILER is not None: PROFILER['scenario'] = f"Sweep: {base_scenario['name']}"
+    rows = []; simulated_years = 0; variant_years = 0
+    stack = [(init_scenario_state(variants[0], inputs.config, inputs.model, inputs.social_security), variants)]
+    while stack:
+        state, group = stack.pop()
+        if state['depleted_year'] is not None or state['year_index'] >= state['projection_years']:
+            summary = summarize_scenario_state(state)
+            for variant in group:
+                row = {**summary, 'Scenario Name': variant['name'], 'Base Scenario': variant['base_name']}
+                row.update({f"{name} SS Age": variant[f"{name}_ss_age"] for name in person_names})
+                row.update({'Roth Strategy': variant.get('roth_strategy'), 'Roth Amount': variant.get('roth_amount', 0), 'Roth End Year': variant.get('roth_end_year', '')})
+                rows.append(row)
+            variant_years += state['year_index'] * len(group)
+            continue
+        branches = {}
+        for variant in group: branches.setdefault(sweep_year_key(variant, state), []).append(variant)
+        for n, subgroup in enumerate(branches.values()):
+            branch_state = state if n == len(branches) - 1 else copy_scenario_state(state)
+            enter_sweep_branch(branch_state, subgroup[0], ss_data)
+            advance_scenario_year(branch_state); simulated_years += 1
+            stack.append((branch_state, subgroup))
+    return rows, {'variants': len(variants), 'variant_years': variant_years, 'simulated_years': simulated_years}
+
+def run_sweep_chunk(base_scenario, grid=None):
+    rows, base_stats = sweep_base_scenario(base_scenario, WORKER_INPUTS, grid)
+    return rows, base_stats, (take_profile(PROFILER) if PROFILER is not None else None)
+
+def run_sweep(base_scenarios, inputs, grid=None, workers=1):
+    all_rows = []; stats = {'variants': 0, 'variant_years': 0, 'simulated_years': 0}
+    def collect(rows, base_stats):
+        all_rows.extend(rows)
+        for key in stats: stats[key] += base_stats[key]
+    if workers <= 1:
+        for scenario in base_scenarios: collect(*sweep_base_scenario(scenario, inputs, grid))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(inputs, PROFILER is not None)) as executor:
+            for future in [executor.submit(run_sweep_chunk, scenario, grid) for scenario in base_scenarios]:
+                rows, base_stats, sweep_profile = future.result()
+                if sweep_profile is not None: merge_profile(PROFILER, sweep_profile)
+                collect(rows, base_stats)
+    sweep_df = pd.DataFrame(all_rows)
+    sweep_df['PV Rank'] = sweep_df['Present Value'].rank(ascending=False, method='min').astype(int)
+    sweep_df['Tax Rank'] = sweep_df['Total Lifetime Taxes'].rank(method='min').astype(int)
+    sweep_df['IRMAA Rank'] = sweep_df['Total IRMAA Paid'].rank(method='min').astype(int)
+    sweep_df = sweep_df.sort_values(['Present Value', 'Total Lifetime Taxes', 'Total IRMAA Paid'], ascending=[False, True, True], kind='stable').reset_index(drop=True)
+    return sweep_df, stats
+
+# --- Batch Mode: Many Households ---
+# Households are found lazily and handed to the pool a chunk at a time, with only a few chunks in flight. Each chunk's summary rows
+# are appended to one CSV as it finishes, in discovery order, so memory stays flat however many households there are.
+# Household inputs skip the on-disk input cache by default, which would otherwise keep one pickle per household forever.
+BATCH_SUMMARY_FILE = REPORTS_DIR / "batch_summary.csv"
+BATCH_SETTINGS = {'chunk_size': 8, 'chunks_in_flight_per_worker': 2}
+BATCH_COLUMNS = ['Household', 'Scenario Name', 'Final Portfolio Value', 'Present Value', 'CAGR', 'Total Lifetime Taxes', 'Total IRMAA Paid', 'Age Portfolio Depleted', 'Status', 'Error']
+
+def discover_households(source):
+    # Yields (household id, input folder). `source` is either a root folder, searched for every folder holding a config.csv,
+    # or a manifest CSV with an `input_dir` column (relative to the manifest) and an optional `household_id` column.
+    # A manifest row without an input_dir is yielded with a folder of None, so it becomes that household's error row.
+    source = pathlib.Path(source)
+    if source.is_file():
+        row_number = 1
+        for manifest_chunk in pd.read_csv(source, chunksize=1000, dtype=str, skip_blank_lines=False):
+            if 'input_dir' not in manifest_chunk.columns: raise InputDataError(f"FATAL ERROR: Manifest '{source}' needs an 'input_dir' column.")
+            for row in manifest_chunk.itertuples(index=False):
+                row_number += 1
+                household_id = getattr(row, 'household_id', None); has_input_dir = pd.notna(row.input_dir) and row.input_dir.strip()
+                if pd.isna(household_id): household_id = row.input_dir if has_input_dir else f"{source.name} line {row_number}"
+                yield household_id, (source.parent / row.input_dir.strip() if has_input_dir else None)
+        return
+    if not source.is_dir(): raise InputDataError(f"FATAL ERROR: Batch source '{source}' is neither a folder nor a manifest file.")
+    for dir_path, dir_names, file_names in os.walk(source):
+        dir_names.sort()
+        if 'config.csv' in file_names:
+            dir_names.clear()  # a household folder is not searched for nested households
+            yield pathlib.Path(dir_path).relative_to(source).as_posix(), pathlib.Path(dir_path)
+
+def adapt_scenario_to_household(scenario_config, person_names):
+    # Scenarios name their claiming ages after one couple (e.g. 'Mike_ss_age'); for another household they apply in the same order.
+    if all(f"{name}_ss_age" in scenario_config for name in person_names): return scenario_config
+    age_keys = [key for key in scenario_config if key.endswith('_ss_age')]
+    adapted = {key: value for key, value in scenario_config.items() if key not in age_keys}
+    adapted.update({f"{name}_ss_age": scenario_config[key] for name, key in zip(person_names, age_keys)})
+    return adapted
+
+def run_household(household_id, input_dir, scenarios, use_input_cache=False):
+    try:
+        if input_dir is None: raise InputDataError("FATAL ERROR: Manifest row has no input_dir.")
+        inputs = load_inputs(pathlib.Path(input_dir), use_cache=use_input_cache)
+        person_names = list(inputs.social_security.set_index('person_name').to_dict('index'))[:2]
+        return [{'Household': household_id, **summarize_scenario_state(simulate_scenario(adapt_scenario_to_household(scenario, person_names), inputs)), 'Status': 'ok', 'Error': ''}
+                for scenario in scenarios]
+    except Exception as e:
+        # One bad household must not stop the batch: anything it raises becomes its error row.
+        return [{'Household': household_id, 'Status': 'error', 'Error': f"{type(e).__name__}: {str(e).strip()}"}]
+
+def run_household_chunk(households, scenarios, use_input_cache=False):
+    return [row for household_id, input_dir in households for row in run_household(household_id, input_dir, scenarios, use_input_cache)]
+
+def append_batch_rows(rows, output_file):
+    batch_df = pd.DataFrame(rows, columns=BATCH_COLUMNS)
+    for col in ['Final Portfolio Value', 'Present Value', 'Total Lifetime Taxes', 'Total IRMAA Paid']:
+        batch_df[col] = pd.to_numeric(batch_df[col]).round()
+    batch_df.to_csv(output_file, mode='a', header=not output_file.exists(), index=False)
+
+def run_batch(source, scenarios, output_file=BATCH_SUMMARY_FILE, workers=1, chunk_size=None, use_input_cache=False):
+    chunk_size = chunk_size or BATCH_SETTINGS['chunk_size']
+    output_file = pathlib.Path(output_file); output_file.parent.mkdir(parents=True, exist_ok=True); output_file.unlink(missing_ok=True)
+    households = discover_households(source)
+    chunks = iter(lambda: list(itertools.islice(households, chunk_size)), [])
+    stats = {'households': 0, 'failed': 0, 'rows': 0}
+
+    def record(rows):
+        append_batch_rows(rows, output_file)
+        stats['households'] += len({row['Household'] for row in rows}); stats['failed'] += sum(row['Status'] == 'error' for row in rows); stats['rows'] += len(rows)
+        print(f"  - {stats['households']:,} households done ({stats['failed']:,} with errors)")
+
+    if workers <= 1:
+        for chunk in chunks: record(run_household_chunk(chunk, scenarios, use_input_cache))
+        return stats
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(executor.submit(run_household_chunk, chunk, scenarios, use_input_cache))
+            if len(in_flight) >= workers * BATCH_SETTINGS['chunks_in_flight_per_worker']: record(in_flight.popleft().result())
+        while in_flight: record(in_flight.popleft().result())
+    return stats
+
+# --- What-If Service ---
+# A long-lived local HTTP/JSON server. Inputs are parsed once and held by every worker, each worker keeps the tax schedules
+# it has compiled, and answers live in an in-memory LRU, so a repeated question never reaches the pool. Identical requests
+# that arrive while one is still running share that single run.
+WHATIF_SETTINGS = {'host': '127.0.0.1', 'port': 8765, 'cache_entries': 512, 'schedule_entries': 64, 'max_body_bytes': 1024 * 1024, 'read_timeout': 10}
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+WORKER_TAX_SCHEDULES = {}
+
+def warm_tax_schedule(scenario_config, inputs):
+    inflation_path = scenario_inflation_path(scenario_config, inputs.config)
+    schedule_key = (tuple(inflation_path), inputs.config['federal_filing_status'])
+    if schedule_key not in WORKER_TAX_SCHEDULES:
+        if len(WORKER_TAX_SCHEDULES) >= WHATIF_SETTINGS['schedule_entries']: WORKER_TAX_SCHEDULES.clear()
+        WORKER_TAX_SCHEDULES[schedule_key] = compile_tax_schedule(inflation_path, inputs.config['federal_filing_status'])
+    return WORKER_TAX_SCHEDULES[schedule_key]
+
+def run_whatif_scenario(scenario_config):
+    # Runs in a pool worker against its warm WORKER_INPUTS; returns the summary and each yearly metric as a list.
+    state = simulate_scenario(scenario_config, WORKER_INPUTS, warm_tax_schedule(scenario_config, WORKER_INPUTS))
+    results = state['results'][:state['year_index']].astype(np.int64)
+    return {'summary': summarize_scenario_state(state), 'yearly': {metric: results[:, n].tolist() for n, metric in enumerate(state['result_schema']['metrics'])}}
+
+def parse_whatif_scenario(payload, person_names):
+    # Accepts the same dict shape as a SCENARIOS_TO_RUN entry. JSON object keys are always strings, so historical years become ints again.
+    if not isinstance(payload, dict): raise ValueError("Each scenario must be a JSON object shaped like a SCENARIOS_TO_RUN entry.")
+    scenario = {'name': 'What-If', **payload}
+    missing = [f"{name}_ss_age" for name in person_names if f"{name}_ss_age" not in scenario]
+    if missing: raise ValueError(f"Scenario '{scenario['name']}' is missing {', '.join(missing)}.")
+    if scenario.get('historical_data'):
+        scenario['historical_data'] = {int(year): tuple(values) for year, values in scenario['historical_data'].items()}
+    return scenario
+
+async def whatif_result(service, payload):
+    # Answers from the LRU, from an identical run already in flight, or from a new run on the pool. Nothing is awaited before the
+    # run is registered in service['pending'], so concurrent identical requests always find it.
+    scenario = parse_whatif_scenario(payload, service['person_names'])
+    cache_key = scenario_cache_key(scenario, service['inputs'])
+    cache = service['cache']
+    if cache_key in cache:
+        cache.move_to_end(cache_key); service['hits'] += 1
+        return {'cached': True, **cache[cache_key]}
+    run = service['pending'].get(cache_key)
+    if run is not None:
+        service['joined'] += 1
+    else:
+        service['misses'] += 1
+        run = asyncio.get_running_loop().run_in_executor(service['executor'], run_whatif_scenario, scenario)
+        service['pending'][cache_key] = run
+        run.add_done_callback(lambda finished: store_whatif_result(service, cache_key, finished))
+    # Shielded, so a client that disconnects does not cancel a run other requests are waiting on.
+    return {'cached': False, **await asyncio.shield(run)}
+
+def store_whatif_result(service, cache_key, run):
+    del service['pending'][cache_key]
+    if run.cancelled() or run.exception() is not None: return
+    service['cache'][cache_key] = run.result()
+    while len(service['cache']) > service['cache_entries']: service['cache'].popitem(last=False)
+
+def whatif_status(service):
+    return {'inputs': service['inputs'].content_hash, 'people': service['person_names'], 'workers': service['workers'],
+            'cached_results': len(service['cache']), 'running': len(service['pending']), 'hits': service['hits'], 'joined': service['joined'], 'misses': service['misses']}
+
+async def route_whatif_request(service, method, path, body):
+    if method == 'GET' and path == '/health': return 200, whatif_status(service)
+    if method == 'GET' and path == '/scenarios': return 200, SCENARIOS_TO_RUN
+    if method == 'POST' and path == '/run':
+        payload = json.loads(body or b'null')
+        if isinstance(payload, list): return 200, list(await asyncio.gather(*[whatif_result(service, scenario) for scenario in payload]))
+        return 200, await whatif_result(service, payload)
+    return 404, {'error': f"No route for {method} {path}. Use GET /health, GET /scenarios or POST /run."}
+
+async def read_http_request(reader, max_body_bytes):
+    request_line = (await reader.readline()).decode('latin-1').split()
+    if len(request_line) != 3: raise ValueError("Malformed HTTP request line.")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''): break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body_length = int(headers.get('content-length', 0))
+    if body_length > max_body_bytes: raise ValueError(f"Request body is larger than {max_body_bytes:,} bytes.")
+    body = await reader.readexactly(body_length) if body_length else b''
+    return request_line[0].upper(), request_line[1].split('?')[0], body
+
+async def handle_whatif_connection(service, reader, writer):
+    # One request per connection; every response, including errors, is a JSON object.
+    try:
+        method, path, body = await asyncio.wait_for(read_http_request(reader, WHATIF_SETTINGS['max_body_bytes']), WHATIF_SETTINGS['read_timeout'])
+        status, payload = await route_whatif_request(service, method, path, body)
+    except (ValueError, KeyError, TypeError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+        status, payload = 400, {'error': f"{type(e).__name__}: {e}"}
+    except Exception as e:
+        status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+    response_body = json.dumps(payload, default=lambda value: value.item() if hasattr(value, 'item') else str(value)).encode()
+    writer.write(f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(response_body)}\r\nConnection: close\r\n\r\n".encode() + response_body)
+    try:
+        await writer.drain()
+        writer.close(); await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+async def serve_whatif(inputs, host=WHATIF_SETTINGS['host'], port=WHATIF_SETTINGS['port'], workers=1, cache_entries=WHATIF_SETTINGS['cache_entries']):
+    service = {'inputs': inputs, 'person_names': list(inputs.social_security.set_index('person_name').to_dict('index'))[:2], 'workers': workers,
+               'cache': OrderedDict(), 'cache_entries': cache_entries, 'pending': {}, 'hits': 0, 'joined': 0, 'misses': 0}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(inputs,)) as executor:
+        service['executor'] = executor
+        # Running the configured scenarios up front starts every worker, compiles the common tax schedules and fills the cache.
+        await asyncio.gather(*[whatif_result(service, scenario) for scenario in SCENARIOS_TO_RUN])
+        server = await asyncio.start_server(lambda reader, writer: handle_whatif_connection(service, reader, writer), host, port)
+        print(f"What-if service ready on http://{host}:{port} ({workers} worker(s), inputs {inputs.content_hash[:12]}). Press Ctrl+C to stop.")
+        async with server: await server.serve_forever()
+
+# --- Engine Consistency Checks ---
+# --check-engines computes the same numbers two independent ways for every scenario and reports the largest disagreement.
+ENGINE_CHECK_TOLERANCE = 1e-6
+ENGINE_CHECK_INCOMES = [0, 20_000, 45_000, 95_000, 180_000, 400_000, 750_000, 1_500_000]
+
+def check_tax_schedule_forms(scenario_config, inputs):
+    # A 1-D inflation path and the same path as a single (1 x years) row must index brackets identically under either price-level rule.
+    inflation_path = scenario_inflation_path(scenario_config, inputs.config)
+    filing_status = inputs.config['federal_filing_status']
+    incomes = np.array(ENGINE_CHECK_INCOMES, dtype=float)
+    worst = 0.0
+    for price_level in ['year_rate', 'compounded']:
+        flat = compile_tax_schedule(inflation_path, filing_status, price_level)
+        stacked = compile_tax_schedule(np.array([inflation_path]), filing_status, price_level)
+        worst = max(worst, np.abs(flat['factor'] - stacked['factor'][0]).max())
+        for i in range(len(inflation_path)):
+            flat_tax = np.array([schedule_federal_tax(flat, i, income) for income in ENGINE_CHECK_INCOMES])
+            worst = max(worst, np.abs(flat_tax - schedule_federal_tax(stacked, i, incomes)).max())
+    return [{'Scenario Name': scenario_config['name'], 'Check': '1-D vs single-row tax schedule', 'Max Difference': worst}]
+
+def check_sensitivity_base(scenario_config, inputs):
+    # Path 0 of a sensitivity batch is the scenario itself, so it must reproduce the yearly engine's summary.
+    sensitivity_summary, _ = run_sensitivity(scenario_config, inputs)
+    scalar_summary = summarize_scenario_state(simulate_scenario(scenario_config, inputs))
+    rows = [{'Scenario Name': scenario_config['name'], 'Check': f'Sensitivity base {outcome}',
+             'Max Difference': abs(sensitivity_summary[f'Base {outcome}'] - scalar_summary[column])}
+            for outcome, column in [('Present Value', 'Present Value'), ('Total Lifetime Taxes', 'Total Lifetime Taxes')]]
+    same_depletion = sensitivity_summary['Base Depletion Age'] == scalar_summary['Age Portfolio Depleted']
+    rows.append({'Scenario Name': scenario_config['name'], 'Check': 'Sensitivity base Depletion Age', 'Max Difference': 0.0 if same_depletion else float('inf')})
+    return rows
+
+def check_engines(scenarios, inputs, tolerance=ENGINE_CHECK_TOLERANCE):
+    checks = [check_tax_schedule_forms, check_sensitivity_base]
+    rows = [row for scenario in scenarios for check in checks for row in check(scenario, inputs)]
+    check_df = pd.DataFrame(rows)
+    check_df['Passed'] = check_df['Max Difference'] <= tolerance
+    return check_df
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retirement portfolio & tax simulator.")
+    parser.add_argument('--monte-carlo', type=int, metavar='PATHS', help="Also run a Monte Carlo analysis with this many market paths per scenario.")
+    parser.add_argument('--seed', type=int, default=MONTE_CARLO_SETTINGS['seed'], help="Random seed for the Monte Carlo draws.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes for simulating scenarios and writing their reports (1 runs serially).")
+    parser.add_argument('--chunk-size', type=int, help=f"Scenarios (or, with --batch, households) sent to a worker per task (default: 1, or {BATCH_SETTINGS['chunk_size']} with --batch).")
+    parser.add_argument('--sweep', type=int, nargs='*', metavar='N', help="Sweep claiming ages and Roth strategies (SWEEP_GRID) around scenarios number N (all scenarios if none given).")
+    parser.add_argument('--backtest', nargs='?', const=str(BACKTEST_SETTINGS['history_file']), metavar='HISTORY_CSV', help="Run every scenario against every starting year of a market history file.")
+    parser.add_argument('--backtest-mode', choices=['wrap', 'truncate'], default=BACKTEST_SETTINGS['window_mode'], help="What a window does once it runs past the end of the history.")
+    parser.add_argument('--solve-spending', choices=['deterministic', 'historical', 'sampled'], help="Find the most each scenario can spend per year and stay funded, under its own assumptions, the backtest history or Monte Carlo paths.")
+    parser.add_argument('--solve-adjustment', choices=['multiplier', 'add_on'], default=SPENDING_SOLVER_SETTINGS['adjustment'], help="Scale every expense line, or add one flat yearly amount.")
+    parser.add_argument('--target-age', type=int, default=SPENDING_SOLVER_SETTINGS['target_age'], help="Age the money has to last through (default: the end of the projection).")
+    parser.add_argument('--success-rate', type=float, default=SPENDING_SOLVER_SETTINGS['success_rate'], help="Share of historical or sampled paths that must stay funded.")
+    parser.add_argument('--sensitivity', type=int, nargs='*', metavar='N', help="Rank how much each numeric input moves scenarios number N (all scenarios if none given), as tornado tables and charts.")
+    parser.add_argument('--tax-mode', choices=['compat', 'gross_up'], help=f"'gross_up' also taxes the traditional withdrawals that pay the tax bill (default: {TAX_MODE}).")
+    parser.add_argument('--batch', metavar='ROOT_OR_MANIFEST', help="Run the scenarios for every household folder under ROOT (or listed in a manifest CSV) instead of input_files_v10.")
+    parser.add_argument('--serve', type=int, nargs='?', const=WHATIF_SETTINGS['port'], metavar='PORT', help=f"Keep the inputs loaded and answer what-if scenarios over HTTP/JSON on {WHATIF_SETTINGS['host']} (default port: {WHATIF_SETTINGS['port']}).")
+    parser.add_argument('--batch-output', type=pathlib.Path, default=BATCH_SUMMARY_FILE, help="CSV the batch summary rows are appended to.")
+    parser.add_argument('--no-input-cache', action='store_true', help="Re-read and re-validate the CSV files even if a cached copy exists.")
+    parser.add_argument('--no-result-cache', action='store_true', help="Re-simulate every scenario instead of reusing results cached by earlier runs.")
+    parser.add_argument('--profile', action='store_true', help="Time each phase of the yearly loop, input loading, CSV writes and plotting; writes a breakdown table and a Chrome trace.")
+    parser.add_argument('--no-plots', action='store_true', help="Skip the reporting stage that renders PNG charts.")
+    parser.add_argument('--check-engines', action='store_true', help="Check that the array forms of the tax schedule and the batched engine reproduce the yearly engine for every scenario, then exit.")
+    parser.add_argument('--no-yearly-csv', action='store_true', help=f"Keep the yearly detail only in {RESULT_STORE_FILE} instead of also exporting one CSV per scenario.")
+    args = parser.parse_args()
+    for option, numbers in [('--sweep', args.sweep), ('--sensitivity', args.sensitivity)]:
+        if numbers and not all(1 <= n <= len(SCENARIOS_TO_RUN) for n in numbers):
+            parser.error(f"{option}: scenario numbers must be between 1 and {len(SCENARIOS_TO_RUN)}, got {' '.join(map(str, numbers))}.")
+
+    if args.serve is not None:
+        inputs = exit_on_input_error(load_inputs, use_cache=not args.no_input_cache)
+        try: asyncio.run(serve_whatif(inputs, WHATIF_SETTINGS['host'], args.serve, max(1, args.workers)))
+        except KeyboardInterrupt: print("\nWhat-if service stopped.")
+        sys.exit()
+
+    if args.check_engines:
+        inputs = exit_on_input_error(load_inputs, use_cache=not args.no_input_cache)
+        scenarios = [{**scenario, 'tax_mode': args.tax_mode} for scenario in SCENARIOS_TO_RUN] if args.tax_mode else SCENARIOS_TO_RUN
+        check_df = check_engines(scenarios, inputs)
+        print(check_df.to_string(index=False, float_format=lambda value: f'{value:.3g}'))
+        failed = int((~check_df['Passed']).sum())
+        print(f"\n{len(check_df) - failed} of {len(check_df)} checks agree within {ENGINE_CHECK_TOLERANCE:g}.")
+        sys.exit(1 if failed else 0)
+
+    if args.batch:
+        scenarios = [{**scenario, 'tax_mode': args.tax_mode} for scenario in SCENARIOS_TO_RUN] if args.tax_mode else SCENARIOS_TO_RUN
+        print(f"Running {len(scenarios)} scenario(s) for every household in '{args.batch}'...")
+        batch_stats = exit_on_input_error(run_batch, args.batch, scenarios, args.batch_output, max(1, args.workers), args.chunk_size)
+        print(f"\n{batch_stats['households']:,} households, {batch_stats['failed']:,} with errors; {batch_stats['rows']:,} rows saved to {args.batch_output}")
+        sys.exit()
+
     print("Running final simulation (Simplified Tax Model)...")
+    if args.profile: enable_profiling()
+    inputs = exit_on_input_error(load_inputs, use_cache=not args.no_input_cache)
+    if args.solve_spending:
+        try: spending_horizon(args.target_age, int(inputs.config['projection_years']))
+        except ValueError as e: parser.error(f"--target-age: {e}")
     if REPORTS_DIR.exists(): shutil.rmtree(REPORTS_DIR)
-    REPORTS_DIR.mkdir(exist_ok=True); PLOT_DIR.mkdir(exist_ok=True); YEARLY_DIR.mkdir(exist_ok=True)
-    all_summary_results = []
-    
-    for scenario in SCENARIOS_TO_RUN:
-        print(f"  - Simulating: {scenario['name']}")
-        summary_result, details_df = run_single_scenario(scenario.copy())
-        all_summary_results.append(summary_result)
-        safe_name = "".join([c for c in scenario['name'] if c.isalpha() or c.isdigit() or c==' ']).rstrip()
-        details_df.to_csv(YEARLY_DIR / f"{safe_name}_yearly.csv", index=False)
-        print(f"    - Generating plots for {scenario['name']}")
-        plot_financial_overview(details_df, scenario['name'], PLOT_DIR)
-        plot_savings_breakdown(details_df, scenario['name'], PLOT_DIR)
+    REPORTS_DIR.mkdir(exist_ok=True)
+    scenarios = [{**scenario, 'tax_mode': args.tax_mode} for scenario in SCENARIOS_TO_RUN] if args.tax_mode else SCENARIOS_TO_RUN
+    workers = max(1, min(args.workers, len(scenarios)))
+    if workers > 1: print(f"  Using {workers} worker processes.")
+    result_store = create_result_store(RESULT_STORE_FILE, [scenario['name'] for scenario in scenarios], result_store_metrics(inputs), int(inputs.config['start_year']), int(inputs.config['projection_years']))
+    all_summary_results = [None] * len(scenarios); cache_hits = 0
+    for index, summary_result, from_cache in run_scenarios(scenarios, inputs, workers, max(1, args.chunk_size or 1), RESULT_STORE_FILE, use_cache=not args.no_result_cache):
+        all_summary_results[index] = summary_result; cache_hits += from_cache
+    if not args.no_result_cache:
+        evicted = evict_result_cache()
+        print(f"  Result cache: {cache_hits} hit(s), {len(scenarios) - cache_hits} miss(es)" + (f", {evicted} old entries evicted." if evicted else "."))
+    if not args.no_yearly_csv:
+        YEARLY_DIR.mkdir(exist_ok=True)
+        export_store_csvs(result_store, YEARLY_DIR)
+    if not args.no_plots:
+        print("  - Rendering plots...")
+        PLOT_DIR.mkdir(exist_ok=True)
+        plot_jobs = [(plot_stored_scenario, (RESULT_STORE_FILE, n, PLOT_DIR)) for n in range(len(scenarios))]
+        plot_jobs.append((plot_stored_overlay, (RESULT_STORE_FILE, 'Total Savings', PLOT_DIR / 'all_scenarios_savings.png')))
+        render_plots(plot_jobs, args.workers)
         
     summary_df = pd.DataFrame(all_summary_results)
     summary_df['Present Value'] = summary_df['Present Value'].round().map('${:,.0f}'.format)
@@ -412,6 +1999,114 @@ if __name__ == "__main__":
     print(summary_df.to_string(index=False))
     
     output_filename = REPORTS_DIR / 'summary_report_final.csv'
-    summary_df.to_csv(output_filename, index=False)
+    with profile_phase('write_csv', 'Summary Report'): summary_df.to_csv(output_filename, index=False)
     print(f"\nSummary report saved to {output_filename}")
-    print(f"All plots and yearly details saved in the '{REPORTS_DIR}' directory.")
\ No newline at end of file
+    print(f"Yearly details for every scenario saved to {RESULT_STORE_FILE}.")
+    print(f"All plots and yearly details saved in the '{REPORTS_DIR}' directory.")
+
+    if args.monte_carlo:
+        print(f"\nRunning Monte Carlo analysis ({args.monte_carlo:,} paths per scenario)...")
+        MONTE_CARLO_DIR.mkdir(exist_ok=True)
+        mc_summary_results = []; fan_plot_jobs = []
+        for scenario in scenarios:
+            print(f"  - Simulating paths: {scenario['name']}")
+            mc_summary, bands_df, depletion_df = run_monte_carlo(scenario.copy(), {'num_paths': args.monte_carlo, 'seed': args.seed}, inputs)
+            mc_summary_results.append(mc_summary)
+            safe_name = safe_filename(scenario['name'])
+            bands_df.to_csv(MONTE_CARLO_DIR / f"{safe_name}_savings_bands.csv", index=False)
+            depletion_df.to_csv(MONTE_CARLO_DIR / f"{safe_name}_depletion_ages.csv", index=False)
+            fan_plot_jobs.append((plot_percentile_fan, (bands_df, scenario['name'], MONTE_CARLO_DIR)))
+        if not args.no_plots: render_plots(fan_plot_jobs, args.workers)
+        mc_summary_df = pd.DataFrame(mc_summary_results)
+        mc_summary_df['Success Rate'] = mc_summary_df['Success Rate'].map('{:.1%}'.format)
+        for col in ['Median Final Value', 'Median Present Value', 'Median Lifetime Taxes', 'Median IRMAA Paid']:
+            mc_summary_df[col] = mc_summary_df[col].round().map('${:,.0f}'.format)
+        print("\n--- MONTE CARLO SUMMARY ---")
+        print(mc_summary_df.to_string(index=False))
+        mc_output_filename = REPORTS_DIR / 'monte_carlo_summary.csv'
+        mc_summary_df.to_csv(mc_output_filename, index=False)
+        print(f"\nMonte Carlo summary saved to {mc_output_filename}")
+
+    if args.sweep is not None:
+        base_scenarios = [scenarios[n - 1] for n in args.sweep] if args.sweep else scenarios
+        print(f"\nRunning parameter sweep over {len(base_scenarios)} base scenario(s)...")
+        sweep_df, sweep_stats = run_sweep(base_scenarios, inputs, workers=max(1, min(args.workers, len(base_scenarios))))
+        for col in ['Final Portfolio Value', 'Present Value', 'Total Lifetime Taxes', 'Total IRMAA Paid']:
+            sweep_df[col] = sweep_df[col].round()
+        sweep_output_filename = REPORTS_DIR / 'sweep_results.csv'
+        sweep_df.to_csv(sweep_output_filename, index=False)
+        saved = 1 - sweep_stats['simulated_years'] / sweep_stats['variant_years'] if sweep_stats['variant_years'] else 0.0
+        print("\n--- TOP SWEEP VARIANTS BY PRESENT VALUE ---")
+        print(sweep_df.head(10)[['Scenario Name', 'Present Value', 'Total Lifetime Taxes', 'Total IRMAA Paid', 'Age Portfolio Depleted']].to_string(index=False))
+        print(f"\n{sweep_stats['variants']:,} variants covering {sweep_stats['variant_years']:,} scenario-years; simulated {sweep_stats['simulated_years']:,} years thanks to shared prefixes ({saved:.1%} of the work saved).")
+        print(f"Sweep results saved to {sweep_output_filename}")
+
+    if args.backtest:
+        history_df = exit_on_input_error(load_market_history, pathlib.Path(args.backtest))
+        print(f"\nRunning rolling-window backtest over {len(history_df)} start years ({history_df['year'].min()}-{history_df['year'].max()}, {args.backtest_mode})...")
+        BACKTEST_DIR.mkdir(exist_ok=True)
+        backtest_summary_results = []
+        for scenario in scenarios:
+            print(f"  - Backtesting: {scenario['name']}")
+            backtest_summary, windows_df = run_backtest(scenario.copy(), history_df, args.backtest_mode, inputs)
+            backtest_summary_results.append(backtest_summary)
+            windows_df.to_csv(BACKTEST_DIR / f"{safe_filename(scenario['name'])}_windows.csv", index=False)
+        backtest_df = pd.DataFrame(backtest_summary_results)
+        backtest_df['Failure Rate'] = backtest_df['Failure Rate'].map('{:.1%}'.format)
+        for col in ['Worst Case Present Value', 'Median Present Value']:
+            backtest_df[col] = backtest_df[col].round().map('${:,.0f}'.format)
+        print("\n--- HISTORICAL BACKTEST SUMMARY ---")
+        print(backtest_df.to_string(index=False))
+        backtest_output_filename = REPORTS_DIR / 'backtest_summary.csv'
+        backtest_df.to_csv(backtest_output_filename, index=False)
+        print(f"\nBacktest summary saved to {backtest_output_filename}")
+
+    if args.solve_spending:
+        solver_settings = {'adjustment': args.solve_adjustment, 'target_age': args.target_age, 'success_rate': args.success_rate,
+                           'monte_carlo': {'num_paths': args.monte_carlo or MONTE_CARLO_SETTINGS['num_paths'], 'seed': args.seed}}
+        history_df = exit_on_input_error(load_market_history, pathlib.Path(args.backtest or BACKTEST_SETTINGS['history_file'])) if args.solve_spending == 'historical' else None
+        print(f"\nSolving for the maximum sustainable spending ({args.solve_spending} paths, {args.solve_adjustment})...")
+        solver_results = []
+        for scenario in scenarios:
+            print(f"  - Solving: {scenario['name']}")
+            solver_results.append(solve_max_spending(scenario.copy(), inputs, args.solve_spending, solver_settings, history_df, args.backtest_mode))
+        solver_df = pd.DataFrame(solver_results)
+        for col in ['Max Add-On', 'Current First-Year Spending', 'Max First-Year Spending']:
+            if col in solver_df: solver_df[col] = solver_df[col].map(lambda value: '${:,.0f}'.format(value) if pd.notna(value) else 'None')
+        if 'Max Multiplier' in solver_df: solver_df['Max Multiplier'] = solver_df['Max Multiplier'].map('{:.3f}'.format)
+        for col in ['Required Success Rate', 'Success Rate at Max']: solver_df[col] = solver_df[col].map('{:.1%}'.format)
+        solver_df['Full-Run Equivalents'] = solver_df['Full-Run Equivalents'].map('{:.1f}'.format)
+        print("\n--- MAXIMUM SUSTAINABLE SPENDING ---")
+        print(solver_df.to_string(index=False))
+        solver_output_filename = REPORTS_DIR / 'spending_solver.csv'
+        solver_df.to_csv(solver_output_filename, index=False)
+        print(f"\nSpending solver results saved to {solver_output_filename}")
+
+    if args.sensitivity is not None:
+        sensitivity_scenarios = [scenarios[n - 1] for n in args.sensitivity] if args.sensitivity else scenarios
+        print(f"\nRunning sensitivity analysis (rates +/-{SENSITIVITY_SETTINGS['rate_step']:.1%}, amounts +/-{SENSITIVITY_SETTINGS['amount_step']:.0%})...")
+        SENSITIVITY_DIR.mkdir(exist_ok=True)
+        sensitivity_summaries = []; tornado_plot_jobs = []
+        for scenario in sensitivity_scenarios:
+            sensitivity_summary, tornado_df = run_sensitivity(scenario.copy(), inputs)
+            sensitivity_summaries.append(sensitivity_summary)
+            tornado_df.round(4).to_csv(SENSITIVITY_DIR / f"{safe_filename(scenario['name'])}_tornado.csv", index=False)
+            tornado_plot_jobs += [(plot_tornado, (tornado_df, scenario['name'], outcome, sensitivity_summary[f'Base {outcome}'], SENSITIVITY_DIR)) for outcome in SENSITIVITY_OUTCOMES]
+            print(f"\n--- TOP INPUTS BY {SENSITIVITY_SETTINGS['rank_by'].upper()} SWING: {scenario['name']} ({sensitivity_summary['Parameters']} inputs) ---")
+            top_df = tornado_df.head(10)[['Parameter', 'Present Value: Low', 'Present Value: High', 'Total Lifetime Taxes Swing', 'Depletion Age Swing']].copy()
+            for col in ['Present Value: Low', 'Present Value: High', 'Total Lifetime Taxes Swing']: top_df[col] = top_df[col].round().map('${:+,.0f}'.format)
+            print(top_df.to_string(index=False))
+        if not args.no_plots: render_plots(tornado_plot_jobs, args.workers)
+        sensitivity_df = pd.DataFrame(sensitivity_summaries)
+        for col in ['Base Present Value', 'Base Total Lifetime Taxes']: sensitivity_df[col] = sensitivity_df[col].round().map('${:,.0f}'.format)
+        sensitivity_df.to_csv(REPORTS_DIR / 'sensitivity_summary.csv', index=False)
+        print(f"\nTornado tables and charts saved in {SENSITIVITY_DIR}; base outcomes saved to {REPORTS_DIR / 'sensitivity_summary.csv'}")
+
+    if args.profile:
+        breakdown_df = profile_breakdown(PROFILER)
+        breakdown_df.to_csv(REPORTS_DIR / 'profile_breakdown.csv', index=False)
+        write_chrome_trace(PROFILER, REPORTS_DIR / 'profile_trace.json')
+        phase_totals = breakdown_df.dropna(subset=['Total (ms)']).groupby('Phase')[['Calls', 'Total (ms)']].sum().sort_values('Total (ms)', ascending=False)
+        print("\n--- PROFILE (all scenarios) ---")
+        print(phase_totals.to_string(float_format=lambda value: f'{value:,.1f}'))
+        print(f"\nPer-scenario breakdown saved to {REPORTS_DIR / 'profile_breakdown.csv'}; Chrome trace saved to {REPORTS_DIR / 'profile_trace.json'}.")